@@ -20,9 +20,24 @@
 #OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 #THE SOFTWARE.
 
+import hashlib
+
+from fb_retry import FbRateLimiter
+
 
 class FbAccount():
+    """ the token calls are made with
+
+        The class level token, set_access_token(), is the one of the
+        default account. FbObjects bound to an FbAccount instance (see
+        FbObject.set_account) call with its token instead and within its
+        own rate and concurrency budget, so one process can act for many
+        users while they share the transfer engine and connection pool. """
+
+    MAX_CONCURRENT = 8
+
     _access_token = ""
+    _default = None
 
     @classmethod
     def set_access_token(cls, access_token):
@@ -32,3 +47,37 @@ class FbAccount():
     def access_token(cls):
         return cls._access_token
 
+    @classmethod
+    def default(cls):
+        """ the account of unbound FbObjects: the class token and the
+            shared FbRateLimiter """
+        if cls._default is None:
+            cls._default = cls(None, limiter=FbRateLimiter.default())
+        return cls._default
+
+    def __init__(self, token, max_concurrent=MAX_CONCURRENT, limiter=None,
+                 user_id=None):
+        if limiter is None:
+            limiter = FbRateLimiter()
+
+        self._token = token
+        self.user_id = user_id
+        self.max_concurrent = max_concurrent
+        self.limiter = limiter
+
+    def token(self):
+        if self._token is None:
+            return FbAccount._access_token
+        return self._token
+
+    def set_token(self, token):
+        """ e.g. after refreshing an expired token """
+        self._token = token
+
+    def key(self):
+        """ identifies the account in what is written to disk: the user
+            id if given, a digest of the token otherwise (which changes
+            when the token is refreshed) """
+        if self.user_id is not None:
+            return str(self.user_id)
+        return hashlib.sha1(self.token()).hexdigest()
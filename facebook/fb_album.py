@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+from fb_fields import expand
+from fb_object import FbObject
+from fb_photo import FbPhoto
+import fb_types
+
+
+class FbAlbum(FbObject):
+    """ an album; fetch() with photos expanded brings the photos, and
+        whatever of them was asked for, in the same request """
+
+    DEFAULT_FIELDS = ['id', 'name', 'count', 'updated_time']
+    FB_TYPE = fb_types.FB_ALBUM
+
+    @classmethod
+    def photos_fields(cls, limit=25, comments=False, likes=False):
+        """ an album's photos, optionally with their comments and a
+            likes summary, for fetch(DEFAULT_FIELDS + [...]) """
+        fields = ['id', 'name', 'created_time']
+        if comments:
+            fields.append(expand('comments', FbPhoto.COMMENT_FIELDS,
+                                 limit=limit))
+        if likes:
+            fields.append(expand('likes', summary=True, limit=0))
+        return expand('photos', fields, limit=limit)
+
+    def name(self):
+        return self.get('name')
+
+    def photos(self):
+        """ FbPhotos of a fetch that expanded photos """
+        return self._children('photos', FbPhoto)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+""" futures for the FbObject signals, for code running on asyncio.
+
+    This package is python 2, so that means trollius: there is no await
+    or async for, coroutines wait with yield From(...), e.g.
+
+        photo_id = yield From(FbPhoto().create_async(path))
+
+    and the pages of comment_pages() are taken with
+    yield From(pages.__anext__()) until StopAsyncIteration. Transfers
+    have to run on the same loop, see use_asyncio() """
+
+import collections
+import itertools
+import pycurl
+
+from gi.repository import GObject
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+try:
+    StopAsyncIteration
+except NameError:
+    # python 2 has no async iteration. Not StopIteration, that would
+    # silently end the trollius coroutine waiting on the page
+    class StopAsyncIteration(Exception):
+        pass
+
+import fb_error
+from fb_transfer import FbTransferEngine
+
+
+class FbAsyncioTransferEngine(FbTransferEngine):
+    """ runs the transfer engine, and the idle/timeout callbacks of the
+        FbObjects, on an asyncio event loop instead of the GLib main loop """
+
+    def __init__(self, loop=None):
+        if asyncio is None:
+            raise ImportError("asyncio (or trollius) is needed")
+
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._handles = {}
+        self._ids = itertools.count(1)
+        FbTransferEngine.__init__(self)
+
+    def idle_add(self, cb, *args):
+        return self.timeout_add(0, cb, *args)
+
+    def idle_add_threadsafe(self, cb, *args):
+        self._loop.call_soon_threadsafe(self.idle_add, cb, *args)
+
+    def timeout_add(self, timeout_ms, cb, *args):
+        source_id = next(self._ids)
+        self._schedule(source_id, timeout_ms, cb, args)
+        return source_id
+
+    def source_remove(self, source_id):
+        handle = self._handles.pop(source_id, None)
+        if handle is not None:
+            handle.cancel()
+
+    def _schedule(self, source_id, timeout_ms, cb, args):
+        self._handles[source_id] = \
+            self._loop.call_later(timeout_ms / 1000.0, self._fire,
+                                  source_id, timeout_ms, cb, args)
+
+    def _fire(self, source_id, timeout_ms, cb, args):
+        if self._handles.pop(source_id, None) is None:
+            return
+
+        # like GLib, keep calling back while the callback returns True
+        if cb(*args):
+            self._schedule(source_id, timeout_ms, cb, args)
+
+    def _add_watch(self, fd, events):
+        if events & pycurl.POLL_IN:
+            self._loop.add_reader(fd, self._io_cb, fd, GObject.IO_IN)
+        if events & pycurl.POLL_OUT:
+            self._loop.add_writer(fd, self._io_cb, fd, GObject.IO_OUT)
+        return (fd, events)
+
+    def _remove_watch(self, watch_id):
+        fd, events = watch_id
+        if events & pycurl.POLL_IN:
+            self._loop.remove_reader(fd)
+        if events & pycurl.POLL_OUT:
+            self._loop.remove_writer(fd)
+
+
+def use_asyncio(loop=None):
+    """ drive all transfers from an asyncio loop, call before the first one """
+    engine = FbAsyncioTransferEngine(loop)
+    FbTransferEngine.set_default(engine)
+    return engine
+
+
+def _engine_loop():
+    """ the loop the transfers are driven from """
+    engine = FbTransferEngine.default()
+    if isinstance(engine, FbAsyncioTransferEngine):
+        return engine._loop
+    return asyncio.get_event_loop()
+
+
+def _new_future(loop):
+    return asyncio.Future(loop=loop)
+
+
+def signal_future(fb_object, done_signal, failed_signal, start_cb):
+    """ a future resolved with the arguments of done_signal, or failed with
+        FbRequestFailed by failed_signal, after calling start_cb() """
+    future = _new_future(_engine_loop())
+    handler_ids = []
+
+    def disconnect():
+        for handler_id in handler_ids:
+            fb_object.disconnect(handler_id)
+        handler_ids[:] = []
+
+    def done_cb(obj, *args):
+        disconnect()
+        if not future.done():
+            future.set_result(args[0] if len(args) == 1 else args)
+
+    def failed_cb(obj, reason):
+        disconnect()
+        if not future.done():
+            future.set_exception(fb_error.FbRequestFailed(reason))
+
+    handler_ids.append(fb_object.connect(done_signal, done_cb))
+    handler_ids.append(fb_object.connect(failed_signal, failed_cb))
+
+    try:
+        start_cb()
+    except Exception:
+        disconnect()
+        raise
+
+    return future
+
+
+class FbCommentPages():
+    """ async iterator over the pages of FbPhoto.stream_comments """
+
+    def __init__(self, photo, incremental=False):
+        self._photo = photo
+        self._loop = _engine_loop()
+        self._pages = collections.deque()
+        self._waiter = None
+        self._finished = False
+        self._error = None
+
+        self._handler_ids = [
+            photo.connect('comments-page-downloaded', self._page_cb),
+            photo.connect('comments-stream-completed', self._completed_cb),
+            photo.connect('comments-download-failed', self._failed_cb),
+        ]
+        photo.stream_comments(incremental)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = _new_future(self._loop)
+        if len(self._pages) > 0:
+            future.set_result(self._pages.popleft())
+        elif self._error is not None:
+            future.set_exception(fb_error.FbRequestFailed(self._error))
+        elif self._finished:
+            future.set_exception(StopAsyncIteration())
+        else:
+            self._waiter = future
+        return future
+
+    def _wake(self):
+        waiter, self._waiter = self._waiter, None
+        if waiter is None or waiter.done():
+            return
+
+        if len(self._pages) > 0:
+            waiter.set_result(self._pages.popleft())
+        elif self._error is not None:
+            waiter.set_exception(fb_error.FbRequestFailed(self._error))
+        else:
+            waiter.set_exception(StopAsyncIteration())
+
+    def _page_cb(self, photo, comments):
+        self._pages.append(comments)
+        self._wake()
+
+    def _completed_cb(self, photo, count):
+        self._finish()
+
+    def _failed_cb(self, photo, reason):
+        self._error = reason
+        self._finish()
+
+    def _finish(self):
+        self._finished = True
+        for handler_id in self._handler_ids:
+            self._photo.disconnect(handler_id)
+        self._handler_ids = []
+        self._wake()
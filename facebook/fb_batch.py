@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import json
+import logging
+import urllib
+
+from fb_object import FbObject
+import fb_types
+
+
+class FbBatch(FbObject):
+    """ coalesces FbPhoto operations into Graph API batch requests
+
+        Operations queued within WINDOW ms of each other are sent together,
+        MAX_BATCH_SIZE per request, and each result is handed back to the
+        photo that queued it so it emits its usual signals. """
+
+    WINDOW = 50
+    MAX_BATCH_SIZE = 50
+
+    def __init__(self, window=WINDOW, account=None):
+        FbObject.__init__(self, account=account)
+        self._window = window
+        self._pending = []
+        self._flush_id = None
+
+    def add_comment(self, photo, comment):
+        path = photo.COMMENTS_PATH % (photo.fb_object_id)
+        body = urllib.urlencode([('message', comment)])
+        self.add("POST", path, body, photo._add_comment_done, photo.account())
+
+    def refresh_comments(self, photo):
+        path = photo.COMMENTS_PATH % (photo.fb_object_id)
+        self.add("GET", path, None, photo._refresh_comments_done,
+                 photo.account())
+
+    def add(self, method, relative_url, body, done_cb, account=None):
+        """ done_cb(result, response_str) gets the per item HTTP code.
+            Items of an account other than the batch's carry its token """
+        if account is not None and account is not self.account():
+            token = urllib.urlencode([('access_token', account.token())])
+            if method == "GET":
+                separator = '&' if '?' in relative_url else '?'
+                relative_url = relative_url + separator + token
+            elif body is None:
+                body = token
+            else:
+                body = body + '&' + token
+
+        request = {'method': method, 'relative_url': relative_url}
+        if body is not None:
+            request['body'] = body
+
+        self._pending.append((request, done_cb))
+
+        if len(self._pending) >= self.MAX_BATCH_SIZE:
+            self.flush()
+        elif self._flush_id is None:
+            self._flush_id = self._timeout_add(self._window, self._flush_cb)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def flush(self):
+        if self._flush_id is not None:
+            self._source_remove(self._flush_id)
+            self._flush_id = None
+
+        while len(self._pending) > 0:
+            items = self._pending[:self.MAX_BATCH_SIZE]
+            self._pending = self._pending[self.MAX_BATCH_SIZE:]
+            self._send(items)
+
+    def _flush_cb(self):
+        self._flush_id = None
+        self.flush()
+        return False
+
+    def _send(self, items):
+        logging.debug("_send: batch of %d requests" % (len(items)))
+
+        batch = json.dumps([request for request, done_cb in items])
+
+        response = []
+        def write_cb(buf):
+            response.append(buf)
+
+        def done_cb(result):
+            self._send_done(items, result, "".join(response))
+
+        self._http_call(self._graph_url(""), [('batch', batch)], write_cb,
+                        True, fb_types.FB_BATCH, done_cb)
+
+    def _send_done(self, items, result, response_str):
+        responses = None
+        if result == 200:
+            try:
+                responses = json.loads(response_str)
+            except ValueError as ex:
+                logging.debug("Couldn't parse batch response: %s" % str(ex))
+
+        if not isinstance(responses, list) or len(responses) != len(items):
+            logging.debug("batch failed, HTTP resp code: %d" % (result))
+            responses = [None] * len(items)
+
+        for (request, done_cb), response in zip(items, responses):
+            if response is None:
+                code = result if result != 200 else 500
+                body = ""
+            else:
+                code = response.get('code', 500)
+                body = response.get('body') or ""
+
+            try:
+                done_cb(code, body)
+            except Exception as ex:
+                logging.exception("batch item callback failed: %s" % str(ex))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import collections
+import time
+
+
+class FbCacheEntry():
+    def __init__(self, etag, last_modified, body):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.value = None
+        self.value_size = 0
+        self.stored = time.time()
+
+    def size(self):
+        """ about the bytes held by the entry """
+        body_size = len(self.body) if self.body is not None else 0
+        return body_size + self.value_size
+
+    def usable(self):
+        """ whether there is something to answer a 304 with """
+        return self.body is not None or self.value is not None
+
+
+class FbResponseCache():
+    """ in-memory LRU of GET responses, revalidated with conditional GETs.
+
+        Entries are bounded in number and in bytes; one bigger than
+        MAX_ENTRY_BYTES isn't kept at all. An entry may hold the raw body
+        or only the validators and a parsed value, see set_value() """
+
+    MAX_ENTRIES = 256
+    MAX_BYTES = 16 * 1024 * 1024
+    MAX_ENTRY_BYTES = 2 * 1024 * 1024
+    TTL = 3600
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def configure(cls, max_entries=MAX_ENTRIES, ttl=TTL, max_bytes=MAX_BYTES,
+                  max_entry_bytes=MAX_ENTRY_BYTES):
+        """ replace the default cache, max_entries=0 disables caching """
+        cls._default = cls(max_entries, ttl, max_bytes, max_entry_bytes)
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL, max_bytes=MAX_BYTES,
+                 max_entry_bytes=MAX_ENTRY_BYTES):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._max_entry_bytes = max_entry_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        if time.time() - entry.stored > self._ttl:
+            self._bytes -= entry.size()
+            return None
+
+        # move to the most recently used end
+        self._entries[key] = entry
+        return entry
+
+    def store(self, key, etag, last_modified, body=None):
+        """ without a body the entry is only usable once set_value()
+            gives it a value """
+        self.remove(key)
+        if etag is None and last_modified is None:
+            return None
+
+        entry = FbCacheEntry(etag, last_modified, body)
+        if entry.size() > self._max_entry_bytes:
+            return None
+
+        self._entries[key] = entry
+        self._bytes += entry.size()
+        self._evict()
+        return entry
+
+    def set_value(self, key, value, size):
+        """ attach what was parsed from the response to key's entry,
+            size being about the bytes it takes """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        old_size = entry.size()
+        if old_size - entry.value_size + size > self._max_entry_bytes:
+            self.remove(key)
+            return None
+
+        entry.value = value
+        entry.value_size = size
+        self._bytes += entry.size() - old_size
+        self._evict()
+        return entry
+
+    def size(self):
+        """ bytes held by all the entries """
+        return self._bytes
+
+    def _evict(self):
+        while len(self._entries) > self._max_entries or \
+                (self._bytes > self._max_bytes and len(self._entries) > 0):
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size()
+
+    def touch(self, key):
+        entry = self.get(key)
+        if entry is not None:
+            entry.stored = time.time()
+        return entry
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size()
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def request_headers(self, key):
+        entry = self.get(key)
+        if entry is None or not entry.usable():
+            return []
+
+        headers = []
+        if entry.etag is not None:
+            headers.append("If-None-Match: %s" % (entry.etag))
+        if entry.last_modified is not None:
+            headers.append("If-Modified-Since: %s" % (entry.last_modified))
+        return headers
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import array
+import calendar
+import itertools
+import time
+
+
+def _parse_time(time_str):
+    """ Graph timestamps look like 2012-05-01T10:00:00+0000 """
+    timestamp = calendar.timegm(time.strptime(time_str[:19],
+                                              "%Y-%m-%dT%H:%M:%S"))
+    offset = time_str[19:]
+    if len(offset) == 5:
+        seconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+        timestamp += -seconds if offset[0] == '+' else seconds
+    return timestamp
+
+
+class FbComment(object):
+    """ a view of one comment in an FbCommentList; reads like the dicts
+        comments used to be, i.e. comment['from'] still works """
+
+    __slots__ = ('_comments', '_index')
+
+    KEYS = ('from', 'message', 'created_time', 'like_count', 'id')
+
+    def __init__(self, comments, index):
+        self._comments = comments
+        self._index = index
+
+    @property
+    def id(self):
+        return self._comments._ids[self._index]
+
+    @property
+    def author(self):
+        return self._comments._author_names[self._comments._authors[self._index]]
+
+    @property
+    def message(self):
+        return self._comments._messages[self._index]
+
+    @property
+    def created_time(self):
+        return self._comments._created_times[self._index]
+
+    @property
+    def created(self):
+        """ created_time as a unix timestamp, decoded on access """
+        return _parse_time(self.created_time)
+
+    @property
+    def like_count(self):
+        return self._comments._like_counts[self._index]
+
+    def __getitem__(self, key):
+        if key == 'from':
+            return self.author
+        if key in self.KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def __repr__(self):
+        return "FbComment(%r from %r)" % (self.id, self.author)
+
+
+class FbCommentList(object):
+    """ comments stored by column, author names are kept once per list """
+
+    def __init__(self):
+        self._ids = []
+        self._authors = array.array('l')
+        self._author_names = []
+        self._author_index = {}
+        self._messages = []
+        self._created_times = []
+        self._like_counts = array.array('l')
+
+    def append_data(self, c):
+        """ add a comment from its Graph API JSON object """
+        name = c['from']['name']
+        author = self._author_index.get(name)
+        if author is None:
+            author = len(self._author_names)
+            self._author_names.append(name)
+            self._author_index[name] = author
+
+        self._ids.append(c['id'])
+        self._authors.append(author)
+        self._messages.append(c['message'])
+        self._created_times.append(c['created_time'])
+        self._like_counts.append(int(c.get('like_count', 0)))
+
+    def copy(self):
+        comments = FbCommentList()
+        comments._ids = list(self._ids)
+        comments._authors = array.array('l', self._authors)
+        comments._author_names = list(self._author_names)
+        comments._author_index = dict(self._author_index)
+        comments._messages = list(self._messages)
+        comments._created_times = list(self._created_times)
+        comments._like_counts = array.array('l', self._like_counts)
+        return comments
+
+    def size(self):
+        """ about the bytes taken by the comments """
+        strings = itertools.chain(self._ids, self._messages,
+                                  self._created_times, self._author_names)
+        return sum(len(s) for s in strings) + \
+            self._authors.itemsize * (len(self._authors) +
+                                      len(self._like_counts))
+
+    def last(self):
+        if len(self._ids) == 0:
+            return None
+        return self[-1]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self._ids)
+        if index < 0 or index >= len(self._ids):
+            raise IndexError(index)
+        return FbComment(self, index)
+
+    def __iter__(self):
+        for i in range(len(self._ids)):
+            yield FbComment(self, i)
+
+    def __repr__(self):
+        return "FbCommentList(%d comments)" % (len(self))
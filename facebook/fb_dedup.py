@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import hashlib
+import logging
+import sqlite3
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from fb_transfer import FbTransferEngine
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    hash TEXT NOT NULL,
+    account TEXT NOT NULL,
+    photo_id TEXT NOT NULL,
+    used REAL,
+    PRIMARY KEY (hash, account)
+);
+CREATE INDEX IF NOT EXISTS uploads_by_use ON uploads (used);
+"""
+
+
+def _hash_file(path, chunk_size):
+    """ runs in a worker thread, returns (digest, error) """
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest(), None
+    except (IOError, OSError) as ex:
+        return None, str(ex)
+
+
+class FbUploadIndex():
+    """ maps the content hash of uploaded images, per account, to the
+        photo id they got, so FbPhoto.create of the same file again
+        reports the existing photo instead of posting a duplicate
+
+        Files are hashed in worker threads, the index itself is SQLite
+        (path can be ':memory:') and only used from the main loop. The
+        least recently used entries beyond max_entries are evicted. """
+
+    MAX_ENTRIES = 100000
+    CHUNK_SIZE = 64 * 1024
+    THREADS = 2
+
+    def __init__(self, path, max_entries=MAX_ENTRIES, threads=THREADS):
+        self._max_entries = max_entries
+        self._threads = threads
+        self._pool = None
+        # uploads of a key in progress, and who waits for their outcome
+        self._uploading = {}
+
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def lookup(self, image_path, account, done_cb):
+        """ done_cb(key, photo_id) is called from the main loop. With a
+            photo id the file was uploaded already; otherwise the caller
+            uploads it and reports the outcome with commit(key, photo_id)
+            or abandon(key). Lookups of a file being uploaded wait for
+            that upload's outcome """
+        engine = FbTransferEngine.default()
+        account_key = account.key()
+
+        if self._pool is None:
+            self._pool = ThreadPool(self._threads)
+
+        def result_cb(result):
+            engine.idle_add_threadsafe(self._hashed, result, account_key,
+                                       image_path, done_cb)
+
+        self._pool.apply_async(_hash_file, (image_path, self.CHUNK_SIZE),
+                               callback=result_cb)
+
+    def commit(self, key, photo_id):
+        if key is None:
+            return
+
+        self._db.execute("INSERT OR REPLACE INTO uploads "
+                         "(hash, account, photo_id, used) VALUES (?, ?, ?, ?)",
+                         key + (photo_id, time.time()))
+        self._db.commit()
+        self._evict()
+
+        for done_cb in self._uploading.pop(key, []):
+            done_cb(key, photo_id)
+
+    def abandon(self, key):
+        """ the upload failed, the next lookup waiting for it uploads """
+        if key is None or key not in self._uploading:
+            return
+
+        waiting = self._uploading[key]
+        if len(waiting) == 0:
+            del self._uploading[key]
+            return
+
+        waiting.pop(0)(key, None)
+
+    def remove(self, photo_id):
+        """ e.g. once the photo has been deleted """
+        self._db.execute("DELETE FROM uploads WHERE photo_id = ?",
+                         (photo_id,))
+        self._db.commit()
+
+    def count(self):
+        return self._db.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._db.close()
+
+    def _hashed(self, result, account_key, image_path, done_cb):
+        digest, error = result
+        if digest is None:
+            logging.debug("couldn't hash %s: %s" % (image_path, error))
+            done_cb(None, None)
+            return False
+
+        key = (digest, account_key)
+        if key in self._uploading:
+            logging.debug("%s is being uploaded already" % (image_path))
+            self._uploading[key].append(done_cb)
+            return False
+
+        row = self._db.execute("SELECT photo_id FROM uploads "
+                               "WHERE hash = ? AND account = ?",
+                               key).fetchone()
+        if row is not None:
+            logging.debug("%s was uploaded as %s" % (image_path, row[0]))
+            self._db.execute("UPDATE uploads SET used = ? "
+                             "WHERE hash = ? AND account = ?",
+                             (time.time(),) + key)
+            self._db.commit()
+            done_cb(key, str(row[0]))
+            return False
+
+        self._uploading[key] = []
+        done_cb(key, None)
+        return False
+
+    def _evict(self):
+        excess = self.count() - self._max_entries
+        if excess <= 0:
+            return
+
+        self._db.execute("DELETE FROM uploads WHERE rowid IN "
+                         "(SELECT rowid FROM uploads ORDER BY used LIMIT ?)",
+                         (excess,))
+        self._db.commit()
@@ -26,3 +26,6 @@ class FbObjectNotCreatedException(Exception):
 
 class FbBadCall(Exception):
     pass
+
+class FbRequestFailed(Exception):
+    pass
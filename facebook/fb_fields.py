@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+def expand(name, fields=None, **modifiers):
+    """ a field of a Graph fields selection, expanded into its own fields
+        and with modifiers, e.g.
+
+            expand('photos', ['id', expand('likes', summary=True)],
+                   limit=25)
+
+        is photos.limit(25){id,likes.summary(true)}, so an album's photos
+        and their likes come in the same response as the album """
+    field = name
+    for modifier in sorted(modifiers):
+        value = modifiers[modifier]
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        field += ".%s(%s)" % (modifier, value)
+    if fields:
+        field += "{%s}" % (fields_param(fields))
+    return field
+
+
+def fields_param(fields):
+    """ the value of the fields parameter for a list of fields """
+    return ",".join(fields)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import logging
+import multiprocessing
+import os
+import tempfile
+
+from gi.repository import GObject
+
+try:
+    from PIL import Image
+    _RESAMPLE = getattr(Image, 'LANCZOS', getattr(Image, 'ANTIALIAS', None))
+except ImportError:
+    Image = None
+
+from fb_transfer import FbTransferEngine
+
+
+def _optimize(src_path, max_dimension, quality):
+    """ runs in a worker process, returns (path, error) where path is the
+        optimised copy or None if the original should be used """
+    try:
+        return _optimize_image(src_path, max_dimension, quality), None
+    except Exception as ex:
+        return None, str(ex)
+
+
+def _optimize_image(src_path, max_dimension, quality):
+    img = Image.open(src_path)
+    img.thumbnail((max_dimension, max_dimension), _RESAMPLE)
+
+    if img.mode in ('RGBA', 'LA') or \
+            (img.mode == 'P' and 'transparency' in img.info):
+        suffix, fmt, options = '.png', 'PNG', {'optimize': True}
+    else:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        suffix, fmt, options = '.jpg', 'JPEG', {'quality': quality,
+                                                'optimize': True}
+
+    fd, dst_path = tempfile.mkstemp(prefix='fb-', suffix=suffix)
+    os.close(fd)
+    try:
+        # no exif/pnginfo is passed, so the source metadata is dropped
+        img.save(dst_path, fmt, **options)
+    except Exception:
+        os.unlink(dst_path)
+        raise
+
+    if os.path.getsize(dst_path) >= os.path.getsize(src_path):
+        os.unlink(dst_path)
+        return None
+
+    return dst_path
+
+
+class FbImageOptimizer():
+    """ downscales and re-encodes images in a pool of worker processes
+        before they are uploaded """
+
+    MAX_DIMENSION = 2048
+    QUALITY = 85
+
+    def __init__(self, max_dimension=MAX_DIMENSION, quality=QUALITY,
+                 processes=None):
+        self._max_dimension = max_dimension
+        self._quality = quality
+        self._processes = processes
+        self._pool = None
+
+        # results are delivered from the pool's result thread
+        GObject.threads_init()
+
+    @classmethod
+    def available(cls):
+        return Image is not None
+
+    def optimize(self, image_path, done_cb):
+        """ done_cb(path, temporary) is called from the main loop with the
+            path to upload; temporary is True if it should be removed with
+            cleanup() once uploaded. On any problem the original is used """
+        engine = FbTransferEngine.default()
+
+        if Image is None:
+            logging.debug("PIL not available, uploading %s as is" % image_path)
+            engine.idle_add_threadsafe(self._deliver, done_cb,
+                                       image_path, False)
+            return
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._processes)
+
+        def result_cb(result):
+            dst_path, error = result
+            if error is not None:
+                logging.debug("optimising %s failed: %s" % (image_path, error))
+
+            if dst_path is None:
+                engine.idle_add_threadsafe(self._deliver, done_cb,
+                                           image_path, False)
+            else:
+                engine.idle_add_threadsafe(self._deliver, done_cb,
+                                           dst_path, True)
+
+        self._pool.apply_async(_optimize,
+                               (image_path, self._max_dimension,
+                                self._quality),
+                               callback=result_cb)
+
+    def cleanup(self, path):
+        try:
+            os.unlink(path)
+        except OSError as ex:
+            logging.debug("couldn't remove %s: %s" % (path, str(ex)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _deliver(self, done_cb, path, temporary):
+        done_cb(path, temporary)
+        return False
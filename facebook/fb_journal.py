@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import collections
+import json
+import logging
+import os
+
+from gi.repository import GObject
+
+from fb_photo import FbPhoto
+from fb_transfer import FbTransferEngine
+import fb_types
+
+
+# failures worth another try once the network is back
+TRANSIENT_ERRORS = (fb_types.FB_ERROR_NETWORK, fb_types.FB_ERROR_SERVER,
+                    fb_types.FB_ERROR_THROTTLED)
+
+
+class FbWriteJournal(GObject.GObject):
+    """ photo uploads and comments written ahead to an append-only file,
+        so they survive outages and restarts
+
+        Writes are sent max_concurrent at a time. Those that fail because
+        the network (or the server) is down stay in the journal and the
+        journal backs off, retrying every RETRY_INTERVAL up to
+        MAX_RETRY_INTERVAL seconds or when flush() is called. Writes of a
+        photo go out in order, one at a time: a comment waits for the
+        create of its photo.
+
+        The FbPhoto objects given to create and add_comment emit their
+        usual signals. The journal emits the same ones for every write,
+        including those replayed from a previous run, and finished once
+        it is empty. A comment on a photo whose create failed names its
+        write by the journal id add_comment returned, there is no photo
+        id to give. """
+
+    MAX_CONCURRENT = 4
+    RETRY_INTERVAL = 5
+    MAX_RETRY_INTERVAL = 300
+    COMPACT_EVERY = 100
+
+    __gsignals__ = {
+        'photo-created': (GObject.SignalFlags.RUN_FIRST, None, ([str, str])),
+        'photo-create-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str, str])),
+        'comment-added': (GObject.SignalFlags.RUN_FIRST, None, ([str, str])),
+        'comment-add-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str, str])),
+        'finished': (GObject.SignalFlags.RUN_FIRST, None, ([int, int])),
+    }
+
+    def __init__(self, path, max_concurrent=MAX_CONCURRENT, account=None,
+                 dedup=None):
+        GObject.GObject.__init__(self)
+        self._engine = FbTransferEngine.default()
+        self._path = path
+        self._max_concurrent = max_concurrent
+        self._account = account
+        self._dedup = dedup
+
+        self._entries = collections.OrderedDict()
+        self._created = {}
+        self._photos = {}
+        self._in_flight = set()
+        self._next_id = 1
+        self._completed = 0
+        self._done = 0
+        self._failed = 0
+        self._retry_id = None
+        self._retry_interval = self.RETRY_INTERVAL
+        self._closed = False
+
+        self._replay()
+        self._file = open(path, 'a')
+        if len(self._entries) > 0:
+            logging.debug("journal: %d pending writes" % len(self._entries))
+            self._engine.idle_add(self._flush_cb)
+
+    def create(self, photo, image_path):
+        """ returns the journal id of the write """
+        entry = {'op': 'create', 'path': image_path}
+        return self._add(entry, photo)
+
+    def add_comment(self, photo, comment):
+        entry = {'op': 'comment', 'message': comment,
+                 'photo': photo.fb_object_id, 'after': None}
+
+        # the photo may only be created by an earlier write
+        if photo.fb_object_id is None:
+            for entry_id, pending in self._entries.items():
+                if pending['op'] == 'create' and \
+                        self._photos.get(entry_id) is photo:
+                    entry['after'] = entry_id
+            if entry['after'] is None:
+                photo.check_created('add_comment')
+
+        return self._add(entry, photo)
+
+    def pending_count(self):
+        return len(self._entries)
+
+    def flush(self):
+        """ send what is pending now, e.g. once the network is back """
+        if self._retry_id is not None:
+            self._engine.source_remove(self._retry_id)
+            self._retry_id = None
+        self._retry_interval = self.RETRY_INTERVAL
+        self._pump()
+
+    def close(self):
+        """ no more writes are started, those in flight are still
+            recorded when they end """
+        self._closed = True
+        if self._retry_id is not None:
+            self._engine.source_remove(self._retry_id)
+            self._retry_id = None
+        self._close_if_idle()
+
+    def _add(self, entry, photo):
+        entry['id'] = self._next_id
+        self._next_id += 1
+        self._append(entry)
+
+        self._entries[entry['id']] = entry
+        self._photos[entry['id']] = photo
+        self._pump()
+        return entry['id']
+
+    def _replay(self):
+        if not os.path.exists(self._path):
+            return
+
+        with open(self._path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a write cut short by a crash
+                    logging.debug("journal: skipping %r" % (line))
+                    continue
+
+                self._next_id = max(self._next_id, record['id'] + 1)
+                if record['op'] != 'done':
+                    self._entries[record['id']] = record
+                    continue
+
+                entry = self._entries.pop(record['id'], None)
+                if entry is not None and entry['op'] == 'create' and \
+                        record.get('result') is not None:
+                    self._created[record['id']] = record['result']
+
+    def _append(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _photo_key(self, entry):
+        """ writes with the same key go out one at a time, in order """
+        if entry['op'] == 'create':
+            return entry['id']
+        if entry['after'] is not None:
+            return self._created.get(entry['after'], entry['after'])
+        return entry['photo']
+
+    def _flush_cb(self):
+        self._pump()
+        return False
+
+    def _retry_cb(self):
+        self._retry_id = None
+        self._pump()
+        return False
+
+    def _pump(self):
+        if self._closed or self._retry_id is not None:
+            return
+
+        busy = set()
+        for entry_id, entry in self._entries.items():
+            if len(self._in_flight) >= self._max_concurrent:
+                break
+
+            key = self._photo_key(entry)
+            if key in busy:
+                continue
+            busy.add(key)
+
+            if entry_id not in self._in_flight:
+                self._start(entry)
+
+    def _start(self, entry):
+        self._in_flight.add(entry['id'])
+        photo = self._photos.get(entry['id'])
+
+        if entry['op'] == 'create':
+            if photo is None:
+                photo = FbPhoto(account=self._account)
+            if self._dedup is not None:
+                photo.set_dedup(self._dedup)
+            self._watch(photo, entry, 'photo-created', 'photo-create-failed')
+            photo.create(entry['path'])
+            return
+
+        photo_id = entry['photo']
+        if entry['after'] is not None:
+            photo_id = self._created[entry['after']]
+        if photo is None:
+            photo = FbPhoto(photo_id, self._account)
+        elif photo.fb_object_id is None:
+            photo.fb_object_id = photo_id
+        self._watch(photo, entry, 'comment-added', 'comment-add-failed')
+        photo.add_comment(entry['message'])
+
+    def _watch(self, photo, entry, done_signal, failed_signal):
+        handler_ids = []
+
+        def disconnect():
+            for handler_id in handler_ids:
+                photo.disconnect(handler_id)
+
+        def done_cb(photo, result_id):
+            disconnect()
+            self._write_done(entry, photo, result_id)
+
+        def failed_cb(photo, reason):
+            disconnect()
+            self._write_failed(entry, photo, reason)
+
+        handler_ids.append(photo.connect(done_signal, done_cb))
+        handler_ids.append(photo.connect(failed_signal, failed_cb))
+
+    def _write_done(self, entry, photo, result_id):
+        if entry['op'] == 'create':
+            self._created[entry['id']] = result_id
+        self._finish(entry, result_id, None)
+        self._retry_interval = self.RETRY_INTERVAL
+
+        if entry['op'] == 'create':
+            self.emit('photo-created', entry['path'], result_id)
+        else:
+            self.emit('comment-added', photo.fb_object_id, result_id)
+
+        self._pump()
+        self._check_finished()
+        self._close_if_idle()
+
+    def _write_failed(self, entry, photo, reason):
+        self._in_flight.discard(entry['id'])
+
+        if self._closed and photo.error_class in TRANSIENT_ERRORS:
+            self._close_if_idle()
+            return
+
+        if photo.error_class in TRANSIENT_ERRORS:
+            logging.debug("journal: write %d failed (%s), retrying in %ds" % \
+                              (entry['id'], reason, self._retry_interval))
+            if self._retry_id is None:
+                self._retry_id = self._engine.timeout_add(
+                    self._retry_interval * 1000, self._retry_cb)
+                self._retry_interval = min(self.MAX_RETRY_INTERVAL,
+                                           self._retry_interval * 2)
+            return
+
+        self._finish(entry, None, reason)
+        if entry['op'] == 'create':
+            self.emit('photo-create-failed', entry['path'], reason)
+
+            # comments waiting for the photo won't ever be possible
+            for pending in list(self._entries.values()):
+                if pending['op'] == 'comment' and \
+                        pending['after'] == entry['id']:
+                    self._comment_impossible(pending)
+        else:
+            self.emit('comment-add-failed', photo.fb_object_id or "", reason)
+
+        self._pump()
+        self._check_finished()
+        self._close_if_idle()
+
+    def _comment_impossible(self, entry):
+        reason = "Photo create failed"
+        comment_photo = self._photos.get(entry['id'])
+        self._finish(entry, None, reason)
+
+        # there is no photo id, the journal id tells which write it was
+        if comment_photo is not None:
+            comment_photo.emit('comment-add-failed', reason)
+        self.emit('comment-add-failed', str(entry['id']), reason)
+
+    def _finish(self, entry, result_id, error):
+        self._in_flight.discard(entry['id'])
+        del self._entries[entry['id']]
+        self._photos.pop(entry['id'], None)
+        if error is None:
+            self._done += 1
+        else:
+            self._failed += 1
+
+        self._append({'op': 'done', 'id': entry['id'], 'result': result_id,
+                      'error': error})
+
+        self._completed += 1
+        if self._completed >= self.COMPACT_EVERY or len(self._entries) == 0:
+            self._compact()
+
+    def _compact(self):
+        """ rewrite the journal with just the pending writes """
+        self._completed = 0
+
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for entry in self._entries.values():
+                after = entry.get('after')
+                if entry['op'] == 'comment' and after in self._created:
+                    entry['photo'] = self._created[after]
+                    entry['after'] = None
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._file.close()
+        os.rename(tmp_path, self._path)
+        self._file = open(self._path, 'a')
+
+        # pending comments now name their photos themselves
+        self._created = {}
+
+    def _close_if_idle(self):
+        if self._closed and len(self._in_flight) == 0 and \
+                self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _check_finished(self):
+        if len(self._entries) == 0:
+            self.emit('finished', self._done, self._failed)
+            self._done = 0
+            self._failed = 0
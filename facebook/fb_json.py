@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import json
+import logging
+import re
+
+import fb_error
+
+
+class FbJsonStream():
+    """ incremental parser for Graph responses, fed as bytes arrive
+
+        Each element of the top level items_key array (e.g. 'data') is
+        decoded and handed to item_cb as soon as its last byte is seen,
+        so only one element is held at a time. Everything else in the
+        response (paging, errors...) is returned by finish(), with the
+        items array left empty. Elements must be objects or arrays. """
+
+    _SPECIAL = re.compile(r'[{}\[\]",]')
+    _STRING_SPECIAL = re.compile(r'["\\]')
+
+    def __init__(self, items_key, item_cb, max_size=0):
+        self.error = None
+        self._items_key = items_key
+        self._item_cb = item_cb
+        self._max_size = max_size
+        self._size = 0
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expecting_key = False
+        self._key = None
+        self._key_parts = None
+        self._in_items = False
+        self._items_seen = False
+
+        self._rest = []
+        self._element = []
+        self._sink = self._rest
+
+    def feed(self, buf):
+        """ suitable as a curl write callback, returns 0 to abort """
+        if self.error is not None:
+            return 0
+
+        self._size += len(buf)
+        if self._max_size > 0 and self._size > self._max_size:
+            self.error = "Response larger than %d bytes" % (self._max_size)
+            return 0
+
+        try:
+            self._scan(buf)
+        except Exception as ex:
+            logging.debug("Couldn't parse FB response: %s" % str(ex))
+            self.error = "Couldn't parse response: %s" % (str(ex))
+            return 0
+
+        return None
+
+    def finish(self):
+        if self.error is not None:
+            raise fb_error.FbBadCall(self.error)
+
+        try:
+            response_data = json.loads("".join(self._rest))
+        except ValueError as ex:
+            raise fb_error.FbBadCall("Couldn't parse response: %s" % str(ex))
+
+        if not self._items_seen:
+            raise fb_error.FbBadCall("No %s inside the response" %
+                                     (self._items_key))
+
+        return response_data
+
+    def _switch_sink(self, sink, buf, start, end):
+        if self._sink is not None and end > start:
+            self._sink.append(buf[start:end])
+        self._sink = sink
+
+    def _scan(self, buf):
+        n = len(buf)
+        i = 0
+        start = 0
+
+        if self._escape:
+            self._escape = False
+            i = 1
+
+        if self._key_parts is not None:
+            key_start = 0
+
+        while i < n:
+            if self._in_string:
+                m = self._STRING_SPECIAL.search(buf, i)
+                if m is None:
+                    break
+
+                i = m.start()
+                if buf[i] == '\\':
+                    if i + 1 >= n:
+                        self._escape = True
+                    i += 2
+                    continue
+
+                self._in_string = False
+                if self._key_parts is not None:
+                    self._key_parts.append(buf[key_start:i])
+                    self._key = "".join(self._key_parts)
+                    self._key_parts = None
+                    self._expecting_key = False
+                i += 1
+                continue
+
+            m = self._SPECIAL.search(buf, i)
+            if m is None:
+                break
+
+            i = m.start()
+            ch = buf[i]
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expecting_key:
+                    self._key_parts = []
+                    key_start = i + 1
+            elif ch == ',':
+                if self._depth == 1:
+                    self._expecting_key = True
+            elif ch == '{' or ch == '[':
+                self._depth += 1
+                if self._depth == 1:
+                    self._expecting_key = (ch == '{')
+                elif self._depth == 2 and ch == '[' and \
+                        self._key == self._items_key:
+                    self._in_items = True
+                    self._items_seen = True
+                    self._switch_sink(None, buf, start, i + 1)
+                    start = i + 1
+                elif self._depth == 3 and self._in_items:
+                    self._switch_sink(self._element, buf, start, i)
+                    start = i
+            else:
+                self._depth -= 1
+                if self._depth == 2 and self._in_items:
+                    self._switch_sink(None, buf, start, i + 1)
+                    start = i + 1
+                    element = "".join(self._element)
+                    self._element[:] = []
+                    self._item_cb(json.loads(element))
+                elif self._depth == 1 and self._in_items:
+                    self._in_items = False
+                    self._switch_sink(self._rest, buf, start, i)
+                    start = i
+
+            i += 1
+
+        if self._key_parts is not None:
+            self._key_parts.append(buf[key_start:])
+
+        if self._sink is not None:
+            self._sink.append(buf[start:])
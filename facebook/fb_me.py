@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+from fb_album import FbAlbum
+from fb_fields import expand
+from fb_friend import FbFriend
+from fb_object import FbObject
+from fb_status import FbStatus
+import fb_types
+
+
+class FbMe(FbObject):
+    """ the user of the account, e.g. the albums with their photos in one
+        request:
+
+            me.fetch(['name', expand('albums', FbAlbum.DEFAULT_FIELDS +
+                                     [FbAlbum.photos_fields()])]) """
+
+    DEFAULT_FIELDS = ['id', 'name',
+                      expand('friends', FbFriend.DEFAULT_FIELDS),
+                      expand('albums', FbAlbum.DEFAULT_FIELDS),
+                      expand('statuses', FbStatus.DEFAULT_FIELDS)]
+    FB_TYPE = fb_types.FB_USER
+
+    def __init__(self, account=None):
+        FbObject.__init__(self, "me", account)
+
+    def name(self):
+        return self.get('name')
+
+    def friends(self):
+        return self._children('friends', FbFriend)
+
+    def albums(self):
+        return self._children('albums', FbAlbum)
+
+    def statuses(self):
+        return self._children('statuses', FbStatus)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import re
+import urlparse
+
+import fb_types
+
+
+# libcurl timings, all in seconds from the start of the transfer
+TIMING_INFO = (
+    ('namelookup', 'NAMELOOKUP_TIME'),
+    ('connect', 'CONNECT_TIME'),
+    ('appconnect', 'APPCONNECT_TIME'),
+    ('pretransfer', 'PRETRANSFER_TIME'),
+    ('starttransfer', 'STARTTRANSFER_TIME'),
+    ('total', 'TOTAL_TIME'),
+    ('bytes_up', 'SIZE_UPLOAD'),
+    ('bytes_down', 'SIZE_DOWNLOAD'),
+    ('speed_up', 'SPEED_UPLOAD'),
+    ('speed_down', 'SPEED_DOWNLOAD'),
+)
+
+_ID_RE = re.compile(r'/[0-9]+(_[0-9]+)?(?=/|$)')
+
+
+def endpoint_from_url(url):
+    """ /{id}/comments for https://graph.facebook.com/123/comments?... """
+    path = urlparse.urlparse(url).path or '/'
+    return _ID_RE.sub('/{id}', path)
+
+
+def transfer_stats(c):
+    """ timing and size info of a finished curl transfer """
+    stats = {}
+    for name, info in TIMING_INFO:
+        try:
+            stats[name] = c.getinfo(getattr(c, info))
+        except Exception:
+            stats[name] = 0.0
+    return stats
+
+
+class FbHistogram():
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def dump(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts),
+                'count': self.count, 'sum': self.sum}
+
+
+class FbEndpointMetrics():
+    def __init__(self):
+        self.requests = 0
+        self.errors = {}
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.latency = FbHistogram()
+        self.first_byte = FbHistogram()
+
+    def dump(self):
+        return {'requests': self.requests, 'errors': dict(self.errors),
+                'bytes_up': self.bytes_up, 'bytes_down': self.bytes_down,
+                'latency': self.latency.dump(),
+                'first_byte': self.first_byte.dump()}
+
+
+class FbMetrics():
+    """ process-wide counters and latency histograms per endpoint and
+        fb_type, fed by every transfer. Like the transfers, it is only
+        used from the main loop """
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def __init__(self):
+        self._endpoints = {}
+
+    def record(self, endpoint, fb_type, stats, error_class):
+        key = (endpoint, fb_type)
+        metrics = self._endpoints.get(key)
+        if metrics is None:
+            metrics = self._endpoints[key] = FbEndpointMetrics()
+
+        metrics.requests += 1
+        if error_class != fb_types.FB_ERROR_NONE:
+            name = fb_types.FB_ERRORS[error_class]
+            metrics.errors[name] = metrics.errors.get(name, 0) + 1
+        metrics.bytes_up += int(stats['bytes_up'])
+        metrics.bytes_down += int(stats['bytes_down'])
+        metrics.latency.observe(stats['total'])
+        metrics.first_byte.observe(stats['starttransfer'])
+
+    def reset(self):
+        self._endpoints = {}
+
+    def dump(self):
+        """ a JSON serialisable snapshot of all metrics """
+        return [dict(endpoint=endpoint,
+                     fb_type=fb_types.FB_TYPES.get(fb_type, str(fb_type)),
+                     **metrics.dump())
+                for (endpoint, fb_type), metrics
+                in sorted(self._endpoints.items())]
+
+    def prometheus(self):
+        """ the metrics in the Prometheus text exposition format """
+        lines = []
+        for m in self.dump():
+            labels = 'endpoint="%s",fb_type="%s"' % (m['endpoint'],
+                                                     m['fb_type'])
+            lines.append('fb_requests_total{%s} %d' % (labels, m['requests']))
+            for error, count in sorted(m['errors'].items()):
+                lines.append('fb_errors_total{%s,error="%s"} %d' % \
+                                 (labels, error, count))
+            lines.append('fb_bytes_up_total{%s} %d' % (labels, m['bytes_up']))
+            lines.append('fb_bytes_down_total{%s} %d' % \
+                             (labels, m['bytes_down']))
+
+            for name in ('latency', 'first_byte'):
+                h = m[name]
+                cumulative = 0
+                for bound, count in zip(h['buckets'] + ['+Inf'], h['counts']):
+                    cumulative += count
+                    lines.append('fb_%s_seconds_bucket{%s,le="%s"} %d' % \
+                                     (name, labels, bound, cumulative))
+                lines.append('fb_%s_seconds_sum{%s} %f' % \
+                                 (name, labels, h['sum']))
+                lines.append('fb_%s_seconds_count{%s} %d' % \
+                                 (name, labels, h['count']))
+        return "\n".join(lines) + "\n"
@@ -20,17 +20,32 @@
 #OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 #THE SOFTWARE.
 
+import json
 import logging
-import pycurl
 import urllib
 
 from gi.repository import GObject
 
+import fb_error
 import fb_types
 from fb_account import FbAccount
+from fb_fields import fields_param
+from fb_metrics import FbMetrics, endpoint_from_url, transfer_stats
+from fb_pool import FbConnectionPool
+from fb_progress import FbProgress
+from fb_retry import FbRetryPolicy, classify_error
+from fb_scheduler import FbScheduler
+from fb_transfer import FbTransferEngine
 
 
 class FbObject(GObject.GObject):
+    GRAPH_URL = "https://graph.facebook.com"
+    MAX_ERROR_BODY = 64 * 1024
+    # how much of a shared GET is kept to replay to late joiners
+    MAX_REPLAY_BODY = 256 * 1024
+
+    # identical GETs in flight, shared by all FbObjects
+    _flights = {}
 
     __gsignals__ = {
         'transfer-started': (GObject.SignalFlags.RUN_FIRST, None, ([int, int])),
@@ -38,62 +53,356 @@ class FbObject(GObject.GObject):
         'transfer-completed': (GObject.SignalFlags.RUN_FIRST, None, ([int, int])),
         'transfer-failed': (GObject.SignalFlags.RUN_FIRST, None, ([int, int, str])),
         'transfer-state-changed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
+        'transfer-stats': (GObject.SignalFlags.RUN_FIRST, None, ([object])),
+        'fetched': (GObject.SignalFlags.RUN_FIRST, None, ([object])),
+        'fetch-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
     }
 
-    def __init__(self, fb_object_id=None):
+    # what fetch() asks for when not given fields, None for the defaults
+    DEFAULT_FIELDS = None
+    # the fb_types type of the node, objects without one can't be fetched
+    FB_TYPE = None
+
+    _transfer_group = None
+    _fb_account = None
+    _store = None
+
+    def __init__(self, fb_object_id=None, account=None):
         GObject.GObject.__init__(self)
         self.fb_object_id = fb_object_id
+        self._fb_account = account
+        self._data = {}
+        self._edges = {}
 
-    def _http_call(self, url, params, write_cb, post, fb_type):
-        logging.debug('_http_call')
+    def set_account(self, account):
+        """ make this object's calls with an FbAccount other than the
+            default one """
+        self._fb_account = account
+
+    def set_store(self, store):
+        """ keep what this object downloads in an FbStore """
+        self._store = store
+
+    def account(self):
+        if self._fb_account is None:
+            return FbAccount.default()
+        return self._fb_account
+
+    def set_transfer_group(self, transfer_group):
+        """ report the bytes of this object's transfers to an
+            FbTransferGroup """
+        self._transfer_group = transfer_group
+
+    def fetch(self, fields=None):
+        """ GET only the given fields of the object, expansions included
+            (see fb_fields), and emit fetched with the response once the
+            object has been hydrated from it """
+        if self.fb_object_id is None:
+            raise fb_error.FbObjectNotCreatedException(
+                "Need an object id before calling fetch")
+        if self.FB_TYPE is None:
+            raise fb_error.FbBadCall(
+                "%s can't be fetched" % (self.__class__.__name__))
+        if fields is None:
+            fields = self.DEFAULT_FIELDS
+        self._idle_add(self._fetch, fields)
 
-        app_auth_params = [('access_token', FbAccount.access_token())]
+    def hydrate(self, data):
+        """ take the fields of a Graph response, objects of expanded
+            edges are only built when asked for """
+        self._data = data
+        self._edges = {}
+        if self.fb_object_id is None and 'id' in data:
+            self.fb_object_id = str(data['id'])
 
-        states = []
-        def f(*args):
-            logging.debug('will call _http_progress_cb')
-            try:
-                args = list(args) + [fb_type, post, states]
-                self._http_progress_cb(*args)
-            except Exception as ex:
-                logging.debug("oops %s" % (str(ex)))
+    def get(self, name, default=None):
+        """ a fetched field """
+        return self._data.get(name, default)
 
-        c = pycurl.Curl()
-        c.setopt(c.NOPROGRESS, 0)
-        c.setopt(c.PROGRESSFUNCTION, f)
-        c.setopt(c.WRITEFUNCTION, write_cb)
+    def _children(self, name, cls):
+        """ the objects of the expanded edge name, built on first use """
+        if name not in self._edges:
+            children = []
+            edge = self._data.get(name) or {}
+            for item in edge.get('data', []):
+                child = cls(account=self._fb_account)
+                child.hydrate(item)
+                children.append(child)
+            self._edges[name] = children
+        return self._edges[name]
+
+    def _fetch(self, fields):
+        params = []
+        if fields:
+            params.append(('fields', fields_param(fields)))
+
+        response = []
+        def write_cb(buf):
+            response.append(buf)
+
+        def done_cb(result):
+            self._fetch_done(result, "".join(response))
+
+        self._http_call(self._graph_url(self.fb_object_id), params, write_cb,
+                        False, self.FB_TYPE, done_cb)
+        return False
+
+    def _fetch_done(self, result, response_str):
+        if result != 200:
+            logging.debug("_fetch failed, HTTP resp code: %d" % (result))
+            self.emit('fetch-failed', "Fetch failed: %d" % (result))
+            return
+
+        try:
+            data = json.loads(response_str)
+        except ValueError as ex:
+            self.emit('fetch-failed', "Fetch failed: %s" % (str(ex)))
+            return
+
+        self.hydrate(data)
+        self._fetched(data)
+
+    def _fetched(self, data):
+        self.emit('fetched', data)
+
+    def _graph_url(self, path):
+        return "%s/%s" % (self.GRAPH_URL, path)
+
+    def _auth_params(self):
+        return [('access_token', self.account().token())]
+
+    def _get_url(self, url, params):
+        """ full URL of a GET, this is also its FbResponseCache key """
+        params_str = urllib.urlencode(self._auth_params() + params)
+        return "%s?%s" % (url, params_str)
+
+    def _http_call(self, url, params, write_cb, post, fb_type, done_cb,
+                   cache=None, progress=True):
+        """ non-blocking, done_cb(result) is called from the main loop with
+            the HTTP code or, if the transfer itself failed, the curl error.
+
+            Calls wait for the FbRateLimiter of the object's account and
+            then for a slot from the FbScheduler, failures are retried as
+            FbRetryPolicy allows; error bodies are held back
+            until no retry follows, so write_cb only sees the final one.
+
+            GETs given an FbResponseCache are sent as conditional requests;
+            a 304 is passed to done_cb as is and write_cb isn't called.
+            Only the validators of a 200 are cached, the body isn't kept:
+            the caller attaches what it parsed with set_value().
+
+            A GET identical to one already in flight (same URL, params,
+            token and cache) doesn't go out again, it is answered with
+            the response of the one in flight. Joining stops once more
+            than MAX_REPLAY_BODY was received, and only the first
+            caller's write_cb can abort the shared transfer """
+        logging.debug('_http_call')
+
+        app_auth_params = self._auth_params()
 
         if post:
-            c.setopt(c.POST, 1)
-            c.setopt(c.HTTPPOST, app_auth_params + params)
             transfer_type = fb_types.FB_TRANSFER_UPLOAD
             transfer_str = "Upload"
         else:
-            c.setopt(c.HTTPGET, 1)
-            params_str = urllib.urlencode(app_auth_params + params)
-            url = "%s?%s" % (url, params_str)
+            url = self._get_url(url, params)
             transfer_type = fb_types.FB_TRANSFER_DOWNLOAD
             transfer_str = "Download"
 
-        logging.debug("_http_call: %s" % (url))
+        if cache is not None and post:
+            cache = None
 
-        c.setopt(c.URL, url)
-        c.perform()
+        waiters = [(self, write_cb, done_cb)]
+        chunks = []
+        received = [0]
+        # whether identical GETs can still join this one
+        shared = [not post]
+        if not post:
+            flight_key = (url, id(cache))
+            flight = self._flights.get(flight_key)
+            if flight is not None:
+                logging.debug("_http_call: joining in flight %s" % (url))
+                for buf in flight[1]:
+                    write_cb(buf)
+                flight[0].append((self, write_cb, done_cb))
+                return
+            self._flights[flight_key] = (waiters, chunks)
 
-        result = c.getinfo(c.HTTP_CODE)
-        if result != 200:
-            error_reason = "HTTP Code %d" % (result)
-            self.emit('transfer-failed', fb_type, transfer_type, error_reason)
-            self.emit('transfer-state-changed', "%s failed: %s" % (transfer_str, error_reason))
+        def close_flight():
+            if shared[0]:
+                shared[0] = False
+                del self._flights[flight_key]
 
-        c.close()
+        def fan_out_write_cb(buf):
+            received[0] += len(buf)
+            if received[0] > self.MAX_REPLAY_BODY and shared[0]:
+                # too big to replay, identical GETs now go out on their own
+                close_flight()
+                del chunks[:]
+            if shared[0]:
+                chunks.append(buf)
 
-        return result
+            ret = waiters[0][1](buf)
+            for obj, waiter_write_cb, waiter_done_cb in waiters[1:]:
+                try:
+                    waiter_write_cb(buf)
+                except Exception:
+                    logging.exception("_http_call: write_cb of %s failed" % \
+                                          (url))
+            return ret
 
-    def _http_progress_cb(self, download_total, download_done,
-                          upload_total, upload_done, fb_type, post, states):
-        logging.debug('_http_progress_cb')
+        account = self.account()
+        limiter = self._rate_limiter()
+        scheduler = FbScheduler.default()
+        retry_policy = FbRetryPolicy.default()
+
+        def attempt(attempt_no):
+            logging.debug("_http_call: %s (attempt %d)" % (url, attempt_no))
 
+            # a retry starts over, from started to completed
+            progress_tracker = FbProgress(self._transfer_group)
+            def f(*args):
+                try:
+                    args = list(args) + [fb_type, post, progress_tracker]
+                    self._http_progress_cb(*args)
+                except Exception as ex:
+                    logging.debug("oops %s" % (str(ex)))
+
+            c = FbConnectionPool.default().acquire()
+            if progress:
+                c.setopt(c.NOPROGRESS, 0)
+                c.setopt(c.PROGRESSFUNCTION, f)
+
+            if post:
+                c.setopt(c.POST, 1)
+                c.setopt(c.HTTPPOST, app_auth_params + params)
+            else:
+                c.setopt(c.HTTPGET, 1)
+
+            if cache is not None:
+                c.setopt(c.HTTPHEADER, cache.request_headers(url))
+
+            error_body = []
+            headers = {}
+            status = [0]
+            forwarded = []
+
+            # getinfo() can't be used while the transfer runs, so the
+            # status is taken from the header lines
+            def header_cb(line):
+                if line.startswith('HTTP/'):
+                    try:
+                        status[0] = int(line.split()[1])
+                    except (IndexError, ValueError):
+                        pass
+                    headers.clear()
+                elif ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            def gated_write_cb(buf):
+                if status[0] != 200:
+                    if sum(len(b) for b in error_body) < self.MAX_ERROR_BODY:
+                        error_body.append(buf)
+                    return None
+
+                forwarded.append(True)
+                return fan_out_write_cb(buf)
+
+            c.setopt(c.HEADERFUNCTION, header_cb)
+            c.setopt(c.WRITEFUNCTION, gated_write_cb)
+
+            def transfer_done_cb(c, errno, errmsg):
+                if errno != 0:
+                    result = errno
+                    error_reason = "Curl error %d: %s" % (errno, errmsg)
+                else:
+                    result = c.getinfo(c.HTTP_CODE)
+                    error_reason = "HTTP Code %d" % (result)
+
+                stats = transfer_stats(c)
+                FbConnectionPool.default().release(c)
+                scheduler.release(account)
+
+                error_str = "".join(error_body)
+                error_class = classify_error(result, error_str)
+                limiter.report(error_class, headers)
+
+                stats['result'] = result
+                stats['attempt'] = attempt_no
+                stats['endpoint'] = endpoint_from_url(url)
+                stats['fb_type'] = fb_type
+                FbMetrics.default().record(stats['endpoint'], fb_type, stats,
+                                           error_class)
+                self.emit('transfer-stats', stats)
+
+                if len(forwarded) == 0 and \
+                        retry_policy.should_retry(attempt_no + 1, post, result,
+                                                  error_class):
+                    delay = retry_policy.delay(attempt_no)
+                    logging.debug("_http_call: %s, retrying in %.2fs" % \
+                                      (error_reason, delay))
+                    progress_tracker.discard()
+                    self._timeout_add(int(delay * 1000), schedule,
+                                      attempt_no + 1)
+                    return
+
+                if cache is not None:
+                    if result == 200:
+                        cache.store(url, headers.get('etag'),
+                                    headers.get('last-modified'))
+                    elif result == 304:
+                        cache.touch(url)
+
+                close_flight()
+
+                progress_tracker.finish()
+
+                failed = result != 200 and \
+                    not (result == 304 and cache is not None)
+
+                for obj, waiter_write_cb, waiter_done_cb in waiters:
+                    try:
+                        if len(error_str) > 0:
+                            waiter_write_cb(error_str)
+
+                        if failed:
+                            obj.emit('transfer-failed', fb_type,
+                                     transfer_type, error_reason)
+                            obj.emit('transfer-state-changed',
+                                     "%s failed: %s" % \
+                                         (transfer_str, error_reason))
+
+                        waiter_done_cb(result)
+                    except Exception:
+                        logging.exception("_http_call: done_cb of %s failed" % \
+                                              (url))
+
+            c.setopt(c.URL, url)
+            FbTransferEngine.default().add(c, transfer_done_cb)
+
+        def schedule(attempt_no):
+            def start():
+                attempt(attempt_no)
+            limiter.acquire(lambda: scheduler.acquire(account, start))
+            return False
+
+        schedule(0)
+
+    def _idle_add(self, cb, *args):
+        return FbTransferEngine.default().idle_add(cb, *args)
+
+    def _timeout_add(self, timeout_ms, cb, *args):
+        return FbTransferEngine.default().timeout_add(timeout_ms, cb, *args)
+
+    def _source_remove(self, source_id):
+        FbTransferEngine.default().source_remove(source_id)
+
+    def _rate_limiter(self):
+        return self.account().limiter
+
+    def _http_progress_cb(self, download_total, download_done,
+                          upload_total, upload_done, fb_type, post,
+                          progress_tracker):
         if post:
             total = upload_total
             done = upload_done
@@ -108,29 +417,24 @@ class FbObject(GObject.GObject):
         if total == 0:
             return
 
-        current_state = -1
-        if len(states) > 0:
-            current_state = states[-1]
+        state = progress_tracker.update(total, done)
+        if state is None:
+            return
 
-        if done == 0 and 0 not in states:
+        if state == FbProgress.STARTED:
             self.emit('transfer-started', fb_type, transfer_type)
-            state = "started"
-            states.append(0)
-        elif done == total and 2 not in states:
+            state_str = "started"
+        elif state == FbProgress.COMPLETED:
             self.emit('transfer-completed', fb_type, transfer_type)
-            state = "completed"
-            states.append(2)
+            state_str = "completed"
         else:
-            if total != 0 and done != total:
-                perc = int((float(done) / float(total))*100)
-                state = "%d%% done" % (perc)
-                states.append(1)
-                self.emit('transfer-progress', fb_type, transfer_type,
-                          float(done) / float(total))
-
-        if current_state == states[-1]:
+            fraction = float(done) / float(total)
+            self.emit('transfer-progress', fb_type, transfer_type, fraction)
+            state_str = "%d%% done" % (int(fraction * 100))
+
+        if not progress_tracker.state_changed:
             return
 
         self.emit('transfer-state-changed',
                   "%s %s %s" % \
-                      (fb_types.FB_TYPES[fb_type], transfer_str, state))
+                      (fb_types.FB_TYPES[fb_type], transfer_str, state_str))
@@ -26,14 +26,23 @@ import pycurl
 
 from gi.repository import GObject
 
+import fb_async
 import fb_error
+from fb_cache import FbResponseCache
+from fb_comment import FbCommentList
+from fb_fields import expand
+from fb_json import FbJsonStream
 from fb_object import FbObject
+from fb_retry import classify_error
 import fb_types
 
 
 class FbPhoto(FbObject):
-    PHOTOS_URL = "https://graph.facebook.com/me/photos"
-    COMMENTS_URL = "https://graph.facebook.com/%s/comments"
+    PHOTOS_PATH = "me/photos"
+    COMMENTS_PATH = "%s/comments"
+    LIKES_PATH = "%s/likes"
+    COMMENTS_PAGE_SIZE = 100
+    MAX_COMMENTS_BODY_SIZE = 16 * 1024 * 1024
 
     __gsignals__ = {
         'photo-created': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
@@ -42,20 +51,137 @@ class FbPhoto(FbObject):
         'comment-add-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
         'comments-downloaded': (GObject.SignalFlags.RUN_FIRST, None, ([object])),
         'comments-download-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
+        'comments-page-downloaded': (GObject.SignalFlags.RUN_FIRST, None, ([object])),
+        'comments-stream-completed': (GObject.SignalFlags.RUN_FIRST, None, ([int])),
         'likes-downloaded': (GObject.SignalFlags.RUN_FIRST, None, ([object])),
+        'likes-download-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
     }
 
+    COMMENT_FIELDS = ['id', 'from', 'message', 'created_time', 'like_count']
+    DEFAULT_FIELDS = ['id', 'name', 'created_time',
+                      expand('likes', ['id', 'name'], summary=True)]
+    FB_TYPE = fb_types.FB_PHOTO
+
+    _batch = None
+    _optimizer = None
+    _dedup = None
+    _dedup_key = None
+
+    # fb_types.FB_ERROR_* of the last failed create or add_comment
+    error_class = fb_types.FB_ERROR_NONE
+    _upload_path = None
+    _comments_cursor = None
+
     def create(self, image_path):
-        GObject.idle_add(self._create, image_path)
+        self.error_class = fb_types.FB_ERROR_NONE
+        if self._dedup is not None:
+            def lookup_cb(key, photo_id):
+                self._dedup_cb(image_path, key, photo_id)
+            self._dedup.lookup(image_path, self.account(), lookup_cb)
+        else:
+            self._upload(image_path)
+
+    def set_optimizer(self, optimizer):
+        """ downscale/re-encode images with an FbImageOptimizer on create """
+        self._optimizer = optimizer
+
+    def set_dedup(self, index):
+        """ look images up in an FbUploadIndex before uploading them """
+        self._dedup = index
+
+    def set_batch(self, batch):
+        """ route add_comment and refresh_comments through an FbBatch """
+        self._batch = batch
 
     def add_comment(self, comment):
         self.check_created('add_comment')
-        GObject.idle_add(self._add_comment, comment)
+        self.error_class = fb_types.FB_ERROR_NONE
+        if self._batch is not None:
+            self._batch.add_comment(self, comment)
+        else:
+            self._idle_add(self._add_comment, comment)
 
     def refresh_comments(self):
         """ raise an exception if no one is listening """
         self.check_created('refresh_comments')
-        GObject.idle_add(self._refresh_comments)
+        if self._batch is not None:
+            self._batch.refresh_comments(self)
+        else:
+            self._idle_add(self._refresh_comments)
+
+    def stream_comments(self, incremental=False):
+        """ follow the comments paging, emitting comments-page-downloaded
+            per page and comments-stream-completed at the end. With
+            incremental only comments after the last streamed one are
+            fetched """
+        self.check_created('stream_comments')
+        after = None
+        if incremental:
+            after = self._comments_cursor
+            if after is None and self._store is not None:
+                after = self._store.cursor(self.fb_object_id)
+        self._idle_add(self._stream_comments, after, 0)
+
+    def refresh_new_comments(self):
+        self.stream_comments(incremental=True)
+
+    def load_comments(self):
+        """ with an FbStore: emit comments-downloaded with the stored
+            comments right away, then stream only the newer ones. Without
+            one this is refresh_comments """
+        self.check_created('load_comments')
+        if self._store is None:
+            self.refresh_comments()
+        else:
+            self._idle_add(self._load_comments)
+
+    def refresh_likes(self):
+        """ emits likes-downloaded with the likes, see like_count() """
+        self.check_created('refresh_likes')
+        self._idle_add(self._refresh_likes)
+
+    def comments(self):
+        """ the FbCommentList of a fetch that expanded comments """
+        if 'comments' not in self._edges:
+            comments = FbCommentList()
+            edge = self._data.get('comments') or {}
+            for c in edge.get('data', []):
+                comments.append_data(c)
+            self._edges['comments'] = comments
+        return self._edges['comments']
+
+    def likes(self):
+        """ the likes of a fetch that expanded them, as dicts """
+        edge = self._data.get('likes') or {}
+        return edge.get('data', [])
+
+    def like_count(self):
+        """ the total when the likes summary was asked for """
+        edge = self._data.get('likes') or {}
+        summary = edge.get('summary') or {}
+        return summary.get('total_count', len(edge.get('data', [])))
+
+    def create_async(self, image_path):
+        """ awaitable create, resolves to the photo id """
+        return fb_async.signal_future(self, 'photo-created',
+                                      'photo-create-failed',
+                                      lambda: self.create(image_path))
+
+    def add_comment_async(self, comment):
+        """ awaitable add_comment, resolves to the comment id """
+        return fb_async.signal_future(self, 'comment-added',
+                                      'comment-add-failed',
+                                      lambda: self.add_comment(comment))
+
+    def fetch_comments(self):
+        """ awaitable refresh_comments, resolves to an FbCommentList """
+        return fb_async.signal_future(self, 'comments-downloaded',
+                                      'comments-download-failed',
+                                      self.refresh_comments)
+
+    def comment_pages(self, incremental=False):
+        """ async iterator over the pages stream_comments downloads """
+        return fb_async.FbCommentPages(self, incremental)
 
     def check_created(self, method_name):
         if self.fb_object_id is None:
@@ -63,47 +189,108 @@ class FbPhoto(FbObject):
             raise fb_error.FbObjectNotCreatedException(errmsg)
 
     def _add_comment(self, comment):
-        url = self.COMMENTS_URL % (self.fb_object_id)
+        url = self._graph_url(self.COMMENTS_PATH % (self.fb_object_id))
 
         response = []
         def write_cb(buf):
             response.append(buf)
 
-        res = self._http_call(url, [('message', comment)], write_cb, True,
-                              fb_types.FB_COMMENT)
+        def done_cb(res):
+            self._add_comment_done(res, "".join(response))
+
+        self._http_call(url, [('message', comment)], write_cb, True,
+                        fb_types.FB_COMMENT, done_cb)
+        return False
+
+    def _add_comment_done(self, res, response_str):
         if res == 200:
             try:
-                comment_id = self._id_from_response("".join(response))
-                self.emit('comment-added', comment_id)
-            except fb_error.FbBadCall as ex:
+                comment_id = self._id_from_response(response_str)
+            except (fb_error.FbBadCall, ValueError) as ex:
+                self.error_class = fb_types.FB_ERROR_CLIENT
                 self.emit('comment-add-failed', str(ex))
+                return
+            self.emit('comment-added', comment_id)
         else:
             logging.debug("_add_comment failed, HTTP resp code: %d" % (res))
+            self.error_class = classify_error(res, response_str)
             self.emit('comment-add-failed', "Add comment failed: %d" % (res))
 
     def _create(self, image_path):
-        c = pycurl.Curl()
-        params = [('source', (c.FORM_FILE, image_path))]
+        params = [('source', (pycurl.FORM_FILE, image_path))]
 
         response = []
         def write_cb(buf):
             response.append(buf)
 
-        result = self._http_call(self.PHOTOS_URL, params, write_cb,
-                                 True, fb_types.FB_PHOTO)
+        def done_cb(result):
+            self._create_done(result, "".join(response))
+
+        self._http_call(self._graph_url(self.PHOTOS_PATH), params, write_cb,
+                        True, fb_types.FB_PHOTO, done_cb)
+        return False
+
+    def _upload(self, image_path):
+        if self._optimizer is not None:
+            self._optimizer.optimize(image_path, self._optimized_cb)
+        else:
+            self._idle_add(self._create, image_path)
+
+    def _dedup_cb(self, image_path, key, photo_id):
+        if photo_id is not None:
+            self._created(photo_id)
+        else:
+            self._dedup_key = key
+            self._upload(image_path)
+
+    def _created(self, photo_id):
+        self.fb_object_id = photo_id
+        if self._store is not None:
+            self._store.add_photo(photo_id)
+        self.emit('photo-created', photo_id)
+
+    def _optimized_cb(self, image_path, temporary):
+        if temporary:
+            self._upload_path = image_path
+        self._create(image_path)
+
+    def _create_done(self, result, response_str):
+        if self._upload_path is not None:
+            self._optimizer.cleanup(self._upload_path)
+            self._upload_path = None
+
+        dedup_key, self._dedup_key = self._dedup_key, None
+
         if result == 200:
-            photo_id = self._id_from_response("".join(response))
-            self.fb_object_id = photo_id
-            self.emit('photo-created', photo_id)
+            try:
+                photo_id = self._id_from_response(response_str)
+            except (fb_error.FbBadCall, ValueError) as ex:
+                logging.debug("_create: bad response: %s" % (str(ex)))
+                self.error_class = fb_types.FB_ERROR_CLIENT
+                if self._dedup is not None:
+                    self._dedup.abandon(dedup_key)
+                self.emit('photo-create-failed',
+                          "Bad response: %s" % (response_str))
+                return
+
+            if self._dedup is not None:
+                self._dedup.commit(dedup_key, photo_id)
+            self._created(photo_id)
         else:
             logging.debug("_create failed, HTTP resp code: %d" % result)
+            if self._dedup is not None:
+                self._dedup.abandon(dedup_key)
 
-            if result == 400:
+            error_class = classify_error(result, response_str)
+            self.error_class = error_class
+            if error_class == fb_types.FB_ERROR_AUTH:
                 failed_reason = "Expired access token."
-            elif result == 6:
+            elif error_class == fb_types.FB_ERROR_NETWORK:
                 failed_reason = "Network is down."
                 failed_reason += \
                     "Please connect to the network and try again."
+            elif error_class == fb_types.FB_ERROR_THROTTLED:
+                failed_reason = "Too many requests, please try again later."
             else:
                 failed_reason = "Failed reason unknown: %s" % (str(result))
 
@@ -119,48 +306,189 @@ class FbPhoto(FbObject):
         return fb_object_id
 
     def _refresh_comments(self):
-        """ this blocks """
-        url = self.COMMENTS_URL % (self.fb_object_id)
+        url = self._graph_url(self.COMMENTS_PATH % (self.fb_object_id))
 
         logging.debug("_refresh_comments fetching %s" % (url))
 
-        response_comments = []
-        def write_cb(buf):
-            response_comments.append(buf)
+        parser, comments = self._comments_parser()
+
+        cache = FbResponseCache.default()
+        cache_key = self._get_url(url, [])
+
+        def done_cb(ret):
+            self._refresh_comments_parsed(ret, parser, comments, cache,
+                                          cache_key)
+
+        self._http_call(url, [], parser.feed, False, fb_types.FB_COMMENT,
+                        done_cb, cache)
+        return False
+
+    def _refresh_comments_done(self, ret, response_str):
+        parser, comments = self._comments_parser()
+        if ret == 200:
+            parser.feed(response_str)
+        self._refresh_comments_parsed(ret, parser, comments)
+
+    def _refresh_comments_parsed(self, ret, parser, comments, cache=None,
+                                 cache_key=None):
+        entry = None
+        if cache is not None:
+            entry = cache.get(cache_key)
+
+        if ret == 304 and entry is not None and entry.usable():
+            logging.debug("_refresh_comments: not modified")
+            if entry.value is not None:
+                cached, paging = entry.value
+                self._refresh_cursor(paging)
+                # handlers may change what they get, the cached list isn't
+                self._emit_comments(cached.copy())
+                return
+            parser, comments = self._comments_parser()
+            parser.feed(entry.body)
+            ret = 200
 
-        ret =  self._http_call(url, [], write_cb, False, fb_types.FB_COMMENT)
-        if ret != 200:
+        if ret != 200 and parser.error is None:
             logging.debug("_refresh_comments failed, HTTP resp code: %d" % ret)
             self.emit('comments-download-failed',
                       "Comments download failed: %d" % (ret))
             return
 
-        logging.debug("_refresh_comments: %s" % ("".join(response_comments)))
-
         try:
-            response_data = json.loads("".join(response_comments))
-            if 'data' not in response_data:
-                logging.debug("No data inside the FB response")
-                self.emit('comments-download-failed',
-                          "Comments download failed with no data")
-                return
-        except Exception as ex:
-            logging.debug("Couldn't parse FB response: %s" % str(ex))
+            response_data = parser.finish()
+        except fb_error.FbBadCall as ex:
+            if entry is not None:
+                cache.remove(cache_key)
             self.emit('comments-download-failed',
                       "Comments download failed: %s" % (str(ex)))
             return
 
-        comments = []
-        for c in response_data['data']:
-            comment = {}  # this should be an Object
-            comment['from'] = c['from']['name']
-            comment['message'] = c['message']
-            comment['created_time'] = c['created_time']
-            comment['like_count'] = c['like_count']
-            comment['id'] = c['id']
-            comments.append(comment)
+        paging = response_data.get('paging', {})
+        self._refresh_cursor(paging)
+
+        if entry is not None:
+            # handlers may change their list, the cache keeps its own
+            cache.set_value(cache_key, (comments.copy(), paging),
+                            comments.size())
+
+        if self._store is not None:
+            self._store.add_comments(self.fb_object_id, comments)
 
+        self._emit_comments(comments)
+
+    def _refresh_cursor(self, paging):
+        """ refresh_comments only gets the first page: its cursor is
+            only kept if there was none or no page follows, a streamed
+            one may be further along """
+        cursor = paging.get('cursors', {}).get('after')
+        if cursor is None:
+            return
+        if self._comments_cursor is None or 'next' not in paging:
+            self._comments_cursor = cursor
+
+    def _emit_comments(self, comments):
         if len(comments) > 0:
             self.emit('comments-downloaded', comments)
         else:
             self.emit('comments-download-failed', 'No comments found')
+
+    def _load_comments(self):
+        comments = self._store.comments(self.fb_object_id)
+        if len(comments) > 0:
+            self.emit('comments-downloaded', comments)
+
+        self.stream_comments(incremental=True)
+        return False
+
+    def _refresh_likes(self):
+        url = self._graph_url(self.LIKES_PATH % (self.fb_object_id))
+
+        response = []
+        def write_cb(buf):
+            response.append(buf)
+
+        def done_cb(ret):
+            self._refresh_likes_done(ret, "".join(response))
+
+        self._http_call(url, [('summary', 'true')], write_cb, False,
+                        fb_types.FB_LIKE, done_cb)
+        return False
+
+    def _refresh_likes_done(self, ret, response_str):
+        if ret != 200:
+            logging.debug("_refresh_likes failed, HTTP resp code: %d" % ret)
+            self.emit('likes-download-failed',
+                      "Likes download failed: %d" % (ret))
+            return
+
+        try:
+            likes = json.loads(response_str)
+        except ValueError as ex:
+            self.emit('likes-download-failed',
+                      "Likes download failed: %s" % (str(ex)))
+            return
+
+        self._data['likes'] = likes
+        self.emit('likes-downloaded', self.likes())
+
+    def _fetched(self, data):
+        FbObject._fetched(self, data)
+        if 'likes' in data:
+            self.emit('likes-downloaded', self.likes())
+
+    def _comments_parser(self):
+        """ returns an FbJsonStream and the FbCommentList it fills """
+        comments = FbCommentList()
+        parser = FbJsonStream('data', comments.append_data,
+                              self.MAX_COMMENTS_BODY_SIZE)
+        return parser, comments
+
+    def _stream_comments(self, after, count):
+        url = self._graph_url(self.COMMENTS_PATH % (self.fb_object_id))
+
+        params = [('limit', str(self.COMMENTS_PAGE_SIZE))]
+        if after is not None:
+            params.append(('after', after))
+
+        logging.debug("_stream_comments fetching %s after %s" % (url, after))
+
+        parser, comments = self._comments_parser()
+
+        def done_cb(ret):
+            self._stream_comments_done(ret, parser, comments, count)
+
+        self._http_call(url, params, parser.feed, False, fb_types.FB_COMMENT,
+                        done_cb)
+        return False
+
+    def _stream_comments_done(self, ret, parser, comments, count):
+        if ret != 200 and parser.error is None:
+            logging.debug("_stream_comments failed, HTTP resp code: %d" % ret)
+            self.emit('comments-download-failed',
+                      "Comments download failed: %d" % (ret))
+            return
+
+        try:
+            response_data = parser.finish()
+        except fb_error.FbBadCall as ex:
+            self.emit('comments-download-failed',
+                      "Comments download failed: %s" % (str(ex)))
+            return
+
+        paging = response_data.get('paging', {})
+        cursor = paging.get('cursors', {}).get('after')
+        if cursor is not None:
+            self._comments_cursor = cursor
+
+        if self._store is not None:
+            self._store.add_comments(self.fb_object_id, comments)
+            if cursor is not None:
+                self._store.set_cursor(self.fb_object_id, cursor)
+
+        count += len(comments)
+        if len(comments) > 0:
+            self.emit('comments-page-downloaded', comments)
+
+        if 'next' in paging and cursor is not None:
+            self._stream_comments(cursor, count)
+        else:
+            self.emit('comments-stream-completed', count)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import logging
+import pycurl
+import time
+
+from fb_transfer import FbTransferEngine
+
+
+# CURLOPT_MAXAGE_CONN, libcurl >= 7.65, not named by older pycurl
+MAXAGE_CONN = getattr(pycurl, 'MAXAGE_CONN', 288)
+
+class FbConnectionPool():
+    """ process-wide pool of curl handles shared by all FbObjects
+
+        Handles are reset and kept around after each transfer so their
+        connections, DNS entries and TLS sessions get reused by the next
+        call instead of paying the handshakes again.
+
+        The connections themselves live in the engine's connection cache:
+        one unused for IDLE_TIMEOUT seconds isn't reused any more and
+        libcurl closes it with the next transfer. Idle handles are freed
+        after the same time. """
+
+    MAX_IDLE_HANDLES = 8
+    IDLE_TIMEOUT = 60
+    MAX_CONNECTS = 16
+    MAX_HOST_CONNECTIONS = 6
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def configure(cls, max_idle_handles=MAX_IDLE_HANDLES,
+                  idle_timeout=IDLE_TIMEOUT, max_connects=MAX_CONNECTS,
+                  max_host_connections=MAX_HOST_CONNECTIONS):
+        """ replace the default pool """
+        if cls._default is not None:
+            cls._default.close()
+        cls._default = cls(None, max_idle_handles, idle_timeout, max_connects,
+                           max_host_connections)
+
+    def __init__(self, engine=None, max_idle_handles=MAX_IDLE_HANDLES,
+                 idle_timeout=IDLE_TIMEOUT, max_connects=MAX_CONNECTS,
+                 max_host_connections=MAX_HOST_CONNECTIONS):
+        if engine is None:
+            engine = FbTransferEngine.default()
+
+        self._engine = engine
+        self._max_idle_handles = max_idle_handles
+        self._idle_timeout = idle_timeout
+        self._idle = []
+        self._evict_id = None
+
+        self._share = pycurl.CurlShare()
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self._share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+        engine.set_multi_option(pycurl.M_MAXCONNECTS, max_connects)
+        if hasattr(pycurl, 'M_MAX_HOST_CONNECTIONS'):
+            engine.set_multi_option(pycurl.M_MAX_HOST_CONNECTIONS,
+                                    max_host_connections)
+        if hasattr(pycurl, 'PIPE_MULTIPLEX'):
+            engine.set_multi_option(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+
+    def acquire(self):
+        if len(self._idle) > 0:
+            c, released = self._idle.pop()
+        else:
+            c = pycurl.Curl()
+            c.setopt(pycurl.SHARE, self._share)
+
+        self._setup(c)
+        return c
+
+    def release(self, c):
+        c.reset()
+
+        if len(self._idle) >= self._max_idle_handles:
+            c.close()
+            return
+
+        self._idle.append((c, time.time()))
+        if self._evict_id is None:
+            self._evict_id = self._engine.timeout_add(
+                self._idle_timeout * 1000, self._evict_cb)
+
+    def idle_count(self):
+        return len(self._idle)
+
+    def close(self):
+        if self._evict_id is not None:
+            self._engine.source_remove(self._evict_id)
+            self._evict_id = None
+
+        for c, released in self._idle:
+            c.close()
+        self._idle = []
+
+    def _setup(self, c):
+        c.setopt(pycurl.TCP_KEEPALIVE, 1)
+        c.setopt(pycurl.ENCODING, "gzip")
+        try:
+            c.setopt(MAXAGE_CONN, self._idle_timeout)
+        except pycurl.error as ex:
+            logging.debug("MAXAGE_CONN not available: %s" % (str(ex)))
+
+        if hasattr(pycurl, 'CURL_HTTP_VERSION_2TLS'):
+            try:
+                c.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+                c.setopt(pycurl.PIPEWAIT, 1)
+            except pycurl.error as ex:
+                logging.debug("HTTP/2 not available: %s" % (str(ex)))
+
+    def _evict_cb(self):
+        deadline = time.time() - self._idle_timeout
+
+        keep = []
+        for c, released in self._idle:
+            if released < deadline:
+                c.close()
+            else:
+                keep.append((c, released))
+        self._idle = keep
+
+        logging.debug("connection pool: %d idle handles" % (len(self._idle)))
+
+        if len(self._idle) > 0:
+            return True
+
+        self._evict_id = None
+        return False
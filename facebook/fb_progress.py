@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import time
+
+from gi.repository import GObject
+
+
+class FbProgress():
+    """ per transfer progress tracking, rate limiting the updates that
+        get turned into signals """
+
+    STARTED = 0
+    RUNNING = 1
+    COMPLETED = 2
+
+    MIN_INTERVAL = 0.1
+    MIN_DELTA = 0.01
+
+    def __init__(self, group=None, min_interval=MIN_INTERVAL,
+                 min_delta=MIN_DELTA):
+        self.state = None
+        self.state_changed = False
+        self._group = group
+        self._min_interval = min_interval
+        self._min_delta = min_delta
+        self._last_time = 0
+        self._last_fraction = 0.0
+
+    def update(self, total, done):
+        """ returns the state to report, or None if this update should be
+            swallowed """
+        if self._group is not None:
+            self._group._update(self, total, done)
+
+        previous = self.state
+
+        if self.state is None:
+            self.state = self.STARTED
+        elif done >= total:
+            if self.state == self.COMPLETED:
+                return None
+            self.state = self.COMPLETED
+        else:
+            now = time.time()
+            fraction = float(done) / float(total)
+            if now - self._last_time < self._min_interval or \
+                    fraction - self._last_fraction < self._min_delta:
+                return None
+            self._last_time = now
+            self._last_fraction = fraction
+            self.state = self.RUNNING
+
+        self.state_changed = previous != self.state
+        return self.state
+
+    def finish(self):
+        if self._group is not None:
+            self._group._finish(self)
+
+    def discard(self):
+        """ for an attempt that is retried, its bytes don't count """
+        if self._group is not None:
+            self._group._discard(self)
+
+
+class FbTransferGroup(GObject.GObject):
+    """ aggregates the bytes of many transfers, possibly of different
+        FbObjects, into one progress signal """
+
+    MIN_INTERVAL = 0.25
+
+    __gsignals__ = {
+        'progress': (GObject.SignalFlags.RUN_FIRST, None, ([float, float])),
+    }
+
+    def __init__(self, min_interval=MIN_INTERVAL):
+        GObject.GObject.__init__(self)
+        self._min_interval = min_interval
+        self._last_time = 0
+        self._active = {}
+        self._finished_total = 0
+        self._finished_done = 0
+
+    def bytes(self):
+        """ returns (done, total) bytes over all transfers so far """
+        done = self._finished_done
+        total = self._finished_total
+        for t, d in self._active.values():
+            total += t
+            done += d
+        return done, total
+
+    def active_count(self):
+        return len(self._active)
+
+    def _update(self, progress, total, done):
+        self._active[progress] = (total, done)
+
+        now = time.time()
+        if now - self._last_time < self._min_interval:
+            return
+        self._last_time = now
+
+        done, total = self.bytes()
+        self.emit('progress', float(done), float(total))
+
+    def _discard(self, progress):
+        self._active.pop(progress, None)
+
+    def _finish(self, progress):
+        total, done = self._active.pop(progress, (0, 0))
+        self._finished_total += total
+        self._finished_done += done
+
+        done, total = self.bytes()
+        self.emit('progress', float(done), float(total))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import collections
+import json
+import logging
+import pycurl
+import random
+import time
+
+import fb_types
+from fb_transfer import FbTransferEngine
+
+
+# Graph API error codes, see the Graph API error handling docs
+THROTTLING_CODES = (4, 17, 32, 341, 613)
+AUTH_CODES = (102, 190, 463, 467)
+
+USAGE_HEADERS = ('x-app-usage', 'x-page-usage', 'x-ad-account-usage',
+                 'x-business-use-case-usage')
+
+# curl failed before anything reached the server, safe to retry any call
+CONNECT_ERRORS = (pycurl.E_COULDNT_RESOLVE_PROXY,
+                  pycurl.E_COULDNT_RESOLVE_HOST,
+                  pycurl.E_COULDNT_CONNECT)
+
+
+def graph_error_code(response_str):
+    try:
+        return int(json.loads(response_str)['error']['code'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def classify_error(result, response_str=""):
+    """ result is what _http_call hands to done_cb: a curl error below 100,
+        an HTTP code otherwise """
+    if result == 200 or result == 304:
+        return fb_types.FB_ERROR_NONE
+
+    if result < 100:
+        return fb_types.FB_ERROR_NETWORK
+
+    code = graph_error_code(response_str)
+    if result == 429 or code in THROTTLING_CODES or \
+            (code is not None and 80000 <= code < 80100):
+        return fb_types.FB_ERROR_THROTTLED
+    if result == 401 or code in AUTH_CODES:
+        return fb_types.FB_ERROR_AUTH
+    if result >= 500:
+        return fb_types.FB_ERROR_SERVER
+    return fb_types.FB_ERROR_CLIENT
+
+
+class FbRetryPolicy():
+    """ which failed calls are retried, and after how long """
+
+    MAX_ATTEMPTS = 4
+    BASE_DELAY = 0.5
+    MAX_DELAY = 30.0
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY):
+        self.max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+    def should_retry(self, attempt, post, result, error_class):
+        if attempt >= self.max_attempts:
+            return False
+
+        if error_class == fb_types.FB_ERROR_THROTTLED:
+            return True
+        if error_class == fb_types.FB_ERROR_NETWORK:
+            return not post or result in CONNECT_ERRORS
+        if error_class == fb_types.FB_ERROR_SERVER:
+            return not post
+
+        return False
+
+    def delay(self, attempt):
+        """ exponential backoff with full jitter, in seconds """
+        ceiling = min(self._max_delay, self._base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+
+class FbRateLimiter():
+    """ token bucket shared by all calls, adapting its rate to the usage
+        the Graph API reports: it halves when throttled, is capped below
+        its initial rate in proportion to usage above HIGH_USAGE and
+        otherwise recovers additively """
+
+    RATE = 10.0
+    MIN_RATE = 0.2
+    MAX_RATE = 50.0
+    BURST = 10
+    RECOVERY = 0.1
+    HIGH_USAGE = 75
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def __init__(self, rate=RATE, burst=BURST, min_rate=MIN_RATE,
+                 max_rate=MAX_RATE):
+        self.rate = rate
+        self._base_rate = float(rate)
+        self._burst = burst
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._tokens = float(burst)
+        self._last_refill = time.time()
+        self._waiting = collections.deque()
+        self._timeout_id = None
+
+    def acquire(self, cb):
+        """ cb() is called, possibly right away, once a call may be made """
+        self._waiting.append(cb)
+        self._dispatch()
+
+    def waiting_count(self):
+        return len(self._waiting)
+
+    def report(self, error_class, headers):
+        usage = self._usage(headers)
+
+        # the same usage always gives the same cap, so it doesn't compound
+        ceiling = self._max_rate
+        if usage >= self.HIGH_USAGE:
+            ceiling = self._base_rate * (100 - usage) / \
+                (100 - self.HIGH_USAGE)
+
+        if error_class == fb_types.FB_ERROR_THROTTLED:
+            self._set_rate(self.rate / 2)
+            self._tokens = 0
+        elif self.rate > ceiling:
+            self._set_rate(ceiling)
+        elif error_class == fb_types.FB_ERROR_NONE:
+            self._set_rate(min(ceiling, self.rate + self.RECOVERY))
+
+    def _set_rate(self, rate):
+        rate = max(self._min_rate, min(self._max_rate, rate))
+        if rate != self.rate:
+            logging.debug("rate limiter: %.2f calls/s" % (rate))
+        self.rate = rate
+
+    def _usage(self, headers):
+        """ highest usage percentage in the usage headers, 0 if none """
+        usage = 0
+        for name in USAGE_HEADERS:
+            if name not in headers:
+                continue
+            try:
+                values = json.loads(headers[name])
+            except ValueError:
+                continue
+
+            # business use case usage is keyed by id, with lists of dicts
+            if isinstance(values, dict) and 'call_count' not in values:
+                values = [v for l in values.values() for v in l]
+            elif isinstance(values, dict):
+                values = [values]
+
+            for v in values:
+                for key in ('call_count', 'total_time', 'total_cputime'):
+                    try:
+                        usage = max(usage, int(v.get(key, 0)))
+                    except (ValueError, TypeError, AttributeError):
+                        pass
+        return usage
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(float(self._burst),
+                           self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _dispatch(self):
+        self._refill()
+        while len(self._waiting) > 0 and self._tokens >= 1:
+            self._tokens -= 1
+            cb = self._waiting.popleft()
+            try:
+                cb()
+            except Exception as ex:
+                logging.exception("rate limited call failed: %s" % str(ex))
+
+        if len(self._waiting) > 0 and self._timeout_id is None:
+            wait = (1 - self._tokens) / self.rate
+            engine = FbTransferEngine.default()
+            self._timeout_id = engine.timeout_add(int(wait * 1000) + 1,
+                                                  self._timeout_cb)
+
+    def _timeout_cb(self):
+        self._timeout_id = None
+        self._dispatch()
+        return False
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import collections
+import logging
+
+
+class FbScheduler():
+    """ hands out transfer slots to the accounts with calls waiting
+
+        Accounts take turns, one call each, so a busy account can't starve
+        the others; every account also stays within its own max_concurrent
+        and all of them within the scheduler's. """
+
+    MAX_CONCURRENT = 64
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self._running = 0
+        self._in_flight = {}
+        # accounts with calls waiting, in turn order
+        self._waiting = collections.OrderedDict()
+
+    def acquire(self, account, cb):
+        """ cb() is called, possibly right away, once account may start a
+            transfer; release(account) must follow when it ends """
+        if account not in self._waiting:
+            self._waiting[account] = collections.deque()
+        self._waiting[account].append(cb)
+        self._dispatch()
+
+    def release(self, account):
+        self._running -= 1
+        count = self._in_flight.pop(account) - 1
+        if count > 0:
+            self._in_flight[account] = count
+        self._dispatch()
+
+    def running_count(self, account=None):
+        if account is None:
+            return self._running
+        return self._in_flight.get(account, 0)
+
+    def waiting_count(self):
+        return sum(len(calls) for calls in self._waiting.values())
+
+    def _dispatch(self):
+        started = True
+        while started and self._running < self.max_concurrent:
+            started = False
+            for account in list(self._waiting.keys()):
+                if self._running >= self.max_concurrent:
+                    break
+                if self._in_flight.get(account, 0) >= account.max_concurrent:
+                    continue
+
+                # a callback may have started this one's calls already
+                calls = self._waiting.pop(account, None)
+                if calls is None:
+                    continue
+
+                cb = calls.popleft()
+                if len(calls) > 0:
+                    self._waiting[account] = calls
+
+                self._running += 1
+                self._in_flight[account] = self._in_flight.get(account, 0) + 1
+                started = True
+                try:
+                    cb()
+                except Exception as ex:
+                    logging.exception("scheduled call failed: %s" % str(ex))
+                    self.release(account)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import logging
+import sqlite3
+import time
+
+from fb_comment import FbCommentList
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    id TEXT PRIMARY KEY,
+    cursor TEXT,
+    synced REAL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    photo_id TEXT NOT NULL,
+    author TEXT,
+    message TEXT,
+    created_time TEXT,
+    created INTEGER,
+    like_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS comments_by_photo ON comments (photo_id, created);
+CREATE INDEX IF NOT EXISTS comments_by_time ON comments (created);
+"""
+
+
+class FbStore():
+    """ SQLite store of photo ids, their comments and sync cursors
+
+        Comments survive restarts, so on startup they are read from here
+        and only the newer ones are fetched (see FbPhoto.load_comments).
+        Once more than max_comments are stored the oldest ones are
+        dropped. path can be ':memory:'. """
+
+    MAX_COMMENTS = 100000
+
+    def __init__(self, path, max_comments=MAX_COMMENTS):
+        self._max_comments = max_comments
+        self._db = sqlite3.connect(path)
+        # pages freed by compaction are given back to the file system
+        self._db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def add_photo(self, photo_id):
+        self._db.execute("INSERT OR IGNORE INTO photos (id) VALUES (?)",
+                         (photo_id,))
+        self._db.commit()
+
+    def remove_photo(self, photo_id):
+        self._db.execute("DELETE FROM comments WHERE photo_id = ?",
+                         (photo_id,))
+        self._db.execute("DELETE FROM photos WHERE id = ?", (photo_id,))
+        self._db.commit()
+
+    def photo_ids(self):
+        rows = self._db.execute("SELECT id FROM photos ORDER BY rowid")
+        return [str(row[0]) for row in rows]
+
+    def cursor(self, photo_id):
+        """ the paging cursor after the last stored comment, or None """
+        row = self._db.execute("SELECT cursor FROM photos WHERE id = ?",
+                               (photo_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return str(row[0])
+
+    def set_cursor(self, photo_id, cursor):
+        self._db.execute("INSERT OR IGNORE INTO photos (id) VALUES (?)",
+                         (photo_id,))
+        self._db.execute("UPDATE photos SET cursor = ?, synced = ? "
+                         "WHERE id = ?", (cursor, time.time(), photo_id))
+        self._db.commit()
+
+    def add_comments(self, photo_id, comments):
+        """ comments is an FbCommentList, already stored ones are updated """
+        rows = [(c.id, photo_id, c.author, c.message, c.created_time,
+                 c.created, c.like_count) for c in comments]
+
+        self._db.execute("INSERT OR IGNORE INTO photos (id) VALUES (?)",
+                         (photo_id,))
+        self._db.executemany("INSERT OR REPLACE INTO comments "
+                             "(id, photo_id, author, message, created_time, "
+                             "created, like_count) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self._db.commit()
+
+        if self.comment_count() > self._max_comments:
+            self.compact()
+
+    def comments(self, photo_id, since=None):
+        """ an FbCommentList of the stored comments, oldest first; since
+            is a unix timestamp """
+        query = "SELECT id, author, message, created_time, like_count " \
+            "FROM comments WHERE photo_id = ?"
+        args = [photo_id]
+        if since is not None:
+            query += " AND created >= ?"
+            args.append(since)
+        query += " ORDER BY created, rowid"
+
+        comments = FbCommentList()
+        for row in self._db.execute(query, args):
+            comments.append_data({'id': row[0],
+                                  'from': {'name': row[1]},
+                                  'message': row[2],
+                                  'created_time': row[3],
+                                  'like_count': row[4]})
+        return comments
+
+    def comment_count(self, photo_id=None):
+        if photo_id is None:
+            row = self._db.execute("SELECT COUNT(*) FROM comments").fetchone()
+        else:
+            row = self._db.execute("SELECT COUNT(*) FROM comments "
+                                   "WHERE photo_id = ?", (photo_id,)).fetchone()
+        return row[0]
+
+    def compact(self):
+        """ drop the oldest comments beyond max_comments """
+        excess = self.comment_count() - self._max_comments
+        if excess <= 0:
+            return
+
+        logging.debug("store: dropping %d old comments" % (excess))
+        self._db.execute("DELETE FROM comments WHERE rowid IN "
+                         "(SELECT rowid FROM comments ORDER BY created "
+                         "LIMIT ?)", (excess,))
+        self._db.commit()
+        self._db.execute("PRAGMA incremental_vacuum")
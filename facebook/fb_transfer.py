@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import logging
+import pycurl
+
+from gi.repository import GObject
+
+
+class FbTransferEngine():
+    """ drives all transfers through one CurlMulti from the GLib main loop """
+
+    _default = None
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def set_default(cls, engine):
+        """ must happen before the first transfer """
+        FbTransferEngine._default = engine
+
+    def __init__(self):
+        self._multi = pycurl.CurlMulti()
+        self._multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket_cb)
+        self._multi.setopt(pycurl.M_TIMERFUNCTION, self._timer_cb)
+        self._watches = {}
+        self._timeout_id = None
+        self._done_cbs = {}
+
+    def add(self, curl, done_cb):
+        """ done_cb(curl, errno, errmsg) is called once the transfer ends;
+            errno is 0 on success """
+        self._done_cbs[curl] = done_cb
+        self._multi.add_handle(curl)
+
+    def remove(self, curl):
+        if curl in self._done_cbs:
+            del self._done_cbs[curl]
+            self._multi.remove_handle(curl)
+
+    def set_multi_option(self, option, value):
+        self._multi.setopt(option, value)
+
+    def active_count(self):
+        return len(self._done_cbs)
+
+    # main loop glue, overridable for other event loops. Callbacks follow
+    # the GLib convention: a timeout is repeated while it returns True
+    def idle_add(self, cb, *args):
+        return GObject.idle_add(cb, *args)
+
+    def idle_add_threadsafe(self, cb, *args):
+        return GObject.idle_add(cb, *args)
+
+    def timeout_add(self, timeout_ms, cb, *args):
+        return GObject.timeout_add(timeout_ms, cb, *args)
+
+    def source_remove(self, source_id):
+        GObject.source_remove(source_id)
+
+    def _add_watch(self, fd, events):
+        condition = GObject.IO_ERR | GObject.IO_HUP
+        if events & pycurl.POLL_IN:
+            condition |= GObject.IO_IN | GObject.IO_PRI
+        if events & pycurl.POLL_OUT:
+            condition |= GObject.IO_OUT
+        return GObject.io_add_watch(fd, condition, self._io_cb)
+
+    def _remove_watch(self, watch_id):
+        GObject.source_remove(watch_id)
+
+    def _add_timeout(self, timeout_ms):
+        return self.timeout_add(timeout_ms, self._timeout_fired_cb)
+
+    def _remove_timeout(self, timeout_id):
+        self.source_remove(timeout_id)
+
+    def _socket_cb(self, event, fd, multi, data):
+        if fd in self._watches:
+            self._remove_watch(self._watches.pop(fd))
+
+        if event != pycurl.POLL_REMOVE:
+            self._watches[fd] = self._add_watch(fd, event)
+
+    def _timer_cb(self, timeout_ms):
+        if self._timeout_id is not None:
+            self._remove_timeout(self._timeout_id)
+            self._timeout_id = None
+
+        if timeout_ms >= 0:
+            self._timeout_id = self._add_timeout(timeout_ms)
+
+    def _timeout_fired_cb(self):
+        self._timeout_id = None
+        self._socket_action(pycurl.SOCKET_TIMEOUT, 0)
+        return False
+
+    def _io_cb(self, fd, condition):
+        ev = 0
+        if condition & (GObject.IO_IN | GObject.IO_PRI):
+            ev |= pycurl.CSELECT_IN
+        if condition & GObject.IO_OUT:
+            ev |= pycurl.CSELECT_OUT
+        if condition & (GObject.IO_ERR | GObject.IO_HUP):
+            ev |= pycurl.CSELECT_ERR
+
+        self._socket_action(fd, ev)
+
+        # _socket_cb drops or replaces the watch when libcurl is done with fd
+        return True
+
+    def _socket_action(self, fd, ev):
+        try:
+            self._multi.socket_action(fd, ev)
+        except pycurl.error as ex:
+            logging.debug("socket_action failed: %s" % (str(ex)))
+        self._process_done()
+
+    def _process_done(self):
+        while True:
+            queued, ok_list, err_list = self._multi.info_read()
+
+            for curl in ok_list:
+                self._finish(curl, 0, None)
+            for curl, errno, errmsg in err_list:
+                self._finish(curl, errno, errmsg)
+
+            if queued == 0:
+                break
+
+    def _finish(self, curl, errno, errmsg):
+        done_cb = self._done_cbs.pop(curl, None)
+        self._multi.remove_handle(curl)
+        if done_cb is None:
+            return
+
+        try:
+            done_cb(curl, errno, errmsg)
+        except Exception as ex:
+            logging.exception("transfer done callback failed: %s" % (str(ex)))
@@ -28,10 +28,34 @@ FB_PHOTO = 0
 FB_COMMENT = 1
 FB_LIKE = 2
 FB_STATUS = 3
+FB_BATCH = 4
+FB_VIDEO = 5
+FB_ALBUM = 6
+FB_USER = 7
 
 FB_TYPES = {
     FB_PHOTO: "Photo",
     FB_COMMENT: "Comment",
     FB_LIKE: "Like",
     FB_STATUS: "Status",
+    FB_BATCH: "Batch",
+    FB_VIDEO: "Video",
+    FB_ALBUM: "Album",
+    FB_USER: "User",
+}
+
+FB_ERROR_NONE = 0
+FB_ERROR_NETWORK = 1
+FB_ERROR_SERVER = 2
+FB_ERROR_CLIENT = 3
+FB_ERROR_AUTH = 4
+FB_ERROR_THROTTLED = 5
+
+FB_ERRORS = {
+    FB_ERROR_NONE: "No error",
+    FB_ERROR_NETWORK: "Network error",
+    FB_ERROR_SERVER: "Server error",
+    FB_ERROR_CLIENT: "Bad request",
+    FB_ERROR_AUTH: "Authentication error",
+    FB_ERROR_THROTTLED: "Rate limited",
 }
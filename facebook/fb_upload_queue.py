@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import heapq
+import logging
+import os
+import time
+
+from gi.repository import GObject
+
+from fb_photo import FbPhoto
+from fb_transfer import FbTransferEngine
+
+
+class FbUploadQueue(GObject.GObject):
+    """ uploads photos from paths, directories or iterators with at most
+        max_concurrent uploads in flight
+
+        Sources are only pulled from when an upload slot frees up, so a
+        large album doesn't get materialised up front. Sources with a
+        higher priority are drained first. """
+
+    MAX_CONCURRENT = 4
+
+    __gsignals__ = {
+        'photo-created': (GObject.SignalFlags.RUN_FIRST, None, ([str, str])),
+        'photo-create-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str, str])),
+        'progress': (GObject.SignalFlags.RUN_FIRST, None, ([int, int, float, float])),
+        'finished': (GObject.SignalFlags.RUN_FIRST, None, ([int, int])),
+    }
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, optimizer=None,
+                 transfer_group=None, account=None, dedup=None):
+        GObject.GObject.__init__(self)
+        self._engine = FbTransferEngine.default()
+        self._max_concurrent = max_concurrent
+        self._optimizer = optimizer
+        self._transfer_group = transfer_group
+        self._account = account
+        self._dedup = dedup
+        self._sources = []
+        self._remaining = {}
+        self._next_source_id = 0
+        self._in_flight = {}
+        self._done = 0
+        self._failed = 0
+        self._bytes_done = 0
+        self._started = None
+
+    def add(self, image_path, priority=0):
+        return self.add_iterator([image_path], priority)
+
+    def add_directory(self, dir_path, priority=0):
+        def paths():
+            for root, dirs, files in os.walk(dir_path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        return self.add_iterator(paths(), priority)
+
+    def add_iterator(self, image_paths, priority=0):
+        """ returns a source id that can be passed to cancel() """
+        source_id = self._next_source_id
+        self._next_source_id += 1
+
+        try:
+            self._remaining[source_id] = len(image_paths)
+        except TypeError:
+            self._remaining[source_id] = None
+
+        heapq.heappush(self._sources,
+                       (-priority, source_id, iter(image_paths)))
+        self._engine.idle_add(self._pump)
+        return source_id
+
+    def cancel(self, source_id):
+        """ drop the uploads of a source that haven't started yet """
+        self._sources = [s for s in self._sources if s[1] != source_id]
+        heapq.heapify(self._sources)
+        self._remaining.pop(source_id, None)
+        self._check_finished()
+
+    def cancel_all(self):
+        self._sources = []
+        self._remaining.clear()
+        self._check_finished()
+
+    def set_max_concurrent(self, max_concurrent):
+        self._max_concurrent = max_concurrent
+        self._engine.idle_add(self._pump)
+
+    def in_flight_count(self):
+        return len(self._in_flight)
+
+    def _next_path(self):
+        while len(self._sources) > 0:
+            priority, source_id, paths = self._sources[0]
+            try:
+                path = next(paths)
+            except StopIteration:
+                heapq.heappop(self._sources)
+                self._remaining.pop(source_id, None)
+                continue
+
+            if self._remaining.get(source_id) is not None:
+                self._remaining[source_id] -= 1
+            return path
+
+        return None
+
+    def _pump(self):
+        while len(self._in_flight) < self._max_concurrent:
+            path = self._next_path()
+            if path is None:
+                break
+            self._start_upload(path)
+
+        self._check_finished()
+        return False
+
+    def _start_upload(self, path):
+        if self._started is None:
+            self._started = time.time()
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+
+        photo = FbPhoto(account=self._account)
+        if self._optimizer is not None:
+            photo.set_optimizer(self._optimizer)
+        if self._dedup is not None:
+            photo.set_dedup(self._dedup)
+        if self._transfer_group is not None:
+            photo.set_transfer_group(self._transfer_group)
+        photo.connect('photo-created', self._photo_created_cb, path)
+        photo.connect('photo-create-failed', self._photo_create_failed_cb,
+                      path)
+        self._in_flight[photo] = size
+        photo.create(path)
+
+    def _photo_created_cb(self, photo, photo_id, path):
+        self._done += 1
+        self._bytes_done += self._in_flight.pop(photo, 0)
+        self.emit('photo-created', path, photo_id)
+        self._upload_finished()
+
+    def _photo_create_failed_cb(self, photo, reason, path):
+        logging.debug("upload of %s failed: %s" % (path, reason))
+        self._failed += 1
+        self._in_flight.pop(photo, None)
+        self.emit('photo-create-failed', path, reason)
+        self._upload_finished()
+
+    def _upload_finished(self):
+        rate, eta = self._rate_and_eta()
+        self.emit('progress', self._done, self._failed, rate, eta)
+        self._pump()
+
+    def _rate_and_eta(self):
+        """ bytes/sec so far and the estimated seconds left, -1 if unknown """
+        elapsed = time.time() - self._started
+        if elapsed <= 0 or self._bytes_done == 0:
+            return 0.0, -1.0
+
+        rate = self._bytes_done / elapsed
+
+        if None in self._remaining.values():
+            return rate, -1.0
+
+        remaining = sum(self._remaining.values()) + len(self._in_flight)
+        avg_size = float(self._bytes_done) / self._done
+        return rate, remaining * avg_size / rate
+
+    def _check_finished(self):
+        if len(self._in_flight) == 0 and len(self._sources) == 0 and \
+                self._started is not None:
+            self.emit('finished', self._done, self._failed)
+            self._started = None
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import json
+import logging
+import mmap
+import os
+import pycurl
+
+from gi.repository import GObject
+
+import fb_error
+from fb_object import FbObject
+from fb_retry import classify_error
+import fb_types
+
+
+class FbVideo(FbObject):
+    """ videos are uploaded with the Graph resumable (chunked) protocol
+
+        The server acknowledges every chunk with the next offsets to send;
+        the last acknowledged offset is kept so a failed chunk is re-sent
+        on its own and resume() can pick up an interrupted upload. """
+
+    VIDEOS_PATH = "me/videos"
+    FB_TYPE = fb_types.FB_VIDEO
+    MAX_CHUNK_RETRIES = 5
+    RETRY_DELAY = 2
+
+    __gsignals__ = {
+        'video-created': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
+        'video-create-failed': (GObject.SignalFlags.RUN_FIRST, None, ([str])),
+    }
+
+    def __init__(self, fb_object_id=None, account=None):
+        FbObject.__init__(self, fb_object_id, account)
+        self._file = None
+        self._map = None
+        self._file_size = 0
+        self._session_id = None
+        self._start_offset = 0
+        self._end_offset = 0
+        self._retries = 0
+        self._retry_id = None
+        self._in_flight = False
+
+    def create(self, video_path):
+        self._idle_add(self._start_upload, video_path)
+
+    def resume(self):
+        """ continue an upload that failed, from the last committed chunk.
+            Does nothing while a chunk is being sent or about to be
+            re-sent """
+        if self._session_id is None or self._map is None:
+            raise fb_error.FbObjectNotCreatedException(
+                "No interrupted upload to resume")
+
+        if self._retry_id is not None or self._in_flight:
+            logging.debug("resume: the upload is still going")
+            return
+
+        self._retries = 0
+        self._idle_add(self._transfer_chunk)
+
+    def committed_bytes(self):
+        return self._start_offset
+
+    def _videos_url(self):
+        return self._graph_url(self.VIDEOS_PATH)
+
+    def _start_upload(self, video_path):
+        try:
+            self._file = open(video_path, 'rb')
+            self._file_size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError) as ex:
+            self._close_file()
+            self.emit('video-create-failed', "Can't read video: %s" % str(ex))
+            return False
+
+        params = [('upload_phase', 'start'),
+                  ('file_size', str(self._file_size))]
+
+        response = []
+        def write_cb(buf):
+            response.append(buf)
+
+        def done_cb(result):
+            self._start_upload_done(result, "".join(response))
+
+        self._http_call(self._videos_url(), params, write_cb, True,
+                        fb_types.FB_VIDEO, done_cb, progress=False)
+        return False
+
+    def _start_upload_done(self, result, response_str):
+        try:
+            response_data = self._response_data(result, response_str)
+            self._session_id = str(response_data['upload_session_id'])
+            self.fb_object_id = str(response_data['video_id'])
+            self._set_offsets(response_data)
+        except fb_error.FbBadCall as ex:
+            self._upload_failed(str(ex))
+            return
+
+        self.emit('transfer-started', fb_types.FB_VIDEO,
+                  fb_types.FB_TRANSFER_UPLOAD)
+        self.emit('transfer-state-changed', "Video upload started")
+        self._transfer_chunk()
+
+    def _transfer_chunk(self):
+        if self._start_offset >= self._end_offset:
+            self._finish_upload()
+            return False
+
+        chunk = self._map[self._start_offset:self._end_offset]
+        params = [('upload_phase', 'transfer'),
+                  ('upload_session_id', self._session_id),
+                  ('start_offset', str(self._start_offset)),
+                  ('video_file_chunk', (pycurl.FORM_BUFFER, 'chunk',
+                                        pycurl.FORM_BUFFERPTR, chunk))]
+
+        logging.debug("_transfer_chunk: %d-%d of %d" % \
+                          (self._start_offset, self._end_offset,
+                           self._file_size))
+
+        response = []
+        def write_cb(buf):
+            response.append(buf)
+
+        def done_cb(result):
+            self._transfer_chunk_done(result, "".join(response))
+
+        self._in_flight = True
+        self._http_call(self._videos_url(), params, write_cb, True,
+                        fb_types.FB_VIDEO, done_cb, progress=False)
+        return False
+
+    def _transfer_chunk_done(self, result, response_str):
+        self._in_flight = False
+        try:
+            response_data = self._response_data(result, response_str)
+            self._set_offsets(response_data)
+        except fb_error.FbBadCall as ex:
+            self._retries += 1
+            # e.g. a bad offset, sending the chunk again won't help
+            error_class = classify_error(result, response_str)
+            if error_class in (fb_types.FB_ERROR_CLIENT,
+                               fb_types.FB_ERROR_AUTH) or \
+                    self._retries > self.MAX_CHUNK_RETRIES:
+                self._upload_failed("Chunk upload failed: %s" % str(ex))
+                return
+
+            logging.debug("_transfer_chunk failed (%s), retry %d from %d" % \
+                              (str(ex), self._retries, self._start_offset))
+            self._retry_id = self._timeout_add(self.RETRY_DELAY * 1000,
+                                               self._retry_cb)
+            return
+
+        self._retries = 0
+        if self._file_size > 0:
+            self.emit('transfer-progress', fb_types.FB_VIDEO,
+                      fb_types.FB_TRANSFER_UPLOAD,
+                      float(self._start_offset) / float(self._file_size))
+        self._transfer_chunk()
+
+    def _retry_cb(self):
+        self._retry_id = None
+        return self._transfer_chunk()
+
+    def _finish_upload(self):
+        params = [('upload_phase', 'finish'),
+                  ('upload_session_id', self._session_id)]
+
+        response = []
+        def write_cb(buf):
+            response.append(buf)
+
+        def done_cb(result):
+            self._finish_upload_done(result, "".join(response))
+
+        self._in_flight = True
+        self._http_call(self._videos_url(), params, write_cb, True,
+                        fb_types.FB_VIDEO, done_cb, progress=False)
+
+    def _finish_upload_done(self, result, response_str):
+        self._in_flight = False
+        try:
+            response_data = self._response_data(result, response_str)
+            if not response_data.get('success', False):
+                raise fb_error.FbBadCall(response_str)
+        except fb_error.FbBadCall as ex:
+            self._upload_failed("Finishing upload failed: %s" % str(ex))
+            return
+
+        self._close_file()
+        self._session_id = None
+        self.emit('transfer-completed', fb_types.FB_VIDEO,
+                  fb_types.FB_TRANSFER_UPLOAD)
+        self.emit('transfer-state-changed', "Video upload completed")
+        self.emit('video-created', self.fb_object_id)
+
+    def _upload_failed(self, reason):
+        logging.debug("video upload failed: %s" % (reason))
+        # keep the mapping while a session exists so resume() can use it
+        if self._session_id is None:
+            self._close_file()
+        self.emit('video-create-failed', reason)
+
+    def _set_offsets(self, response_data):
+        try:
+            self._start_offset = int(response_data['start_offset'])
+            self._end_offset = int(response_data['end_offset'])
+        except (KeyError, ValueError):
+            raise fb_error.FbBadCall(json.dumps(response_data))
+
+    def _response_data(self, result, response_str):
+        if result != 200:
+            raise fb_error.FbBadCall("HTTP Code %d" % (result))
+
+        try:
+            return json.loads(response_str)
+        except ValueError:
+            raise fb_error.FbBadCall(response_str)
+
+    def _close_file(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
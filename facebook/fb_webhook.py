@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012 Raul Gutierrez S. - rgs@itevenworks.net
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in
+#all copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+#THE SOFTWARE.
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import urlparse
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from gi.repository import GObject
+
+from fb_transfer import FbTransferEngine
+
+
+# notification fields that may name the changed object
+OBJECT_ID_FIELDS = ('photo_id', 'object_id', 'post_id', 'parent_id', 'id')
+
+# strongest first, a payload is checked against the first one present
+SIGNATURE_HEADERS = (('x-hub-signature-256', 'sha256', hashlib.sha256),
+                     ('x-hub-signature', 'sha1', hashlib.sha1))
+
+
+def _compare_digest(a, b):
+    """ constant time, hmac.compare_digest is only in python >= 2.7.7 """
+    if hasattr(hmac, 'compare_digest'):
+        return hmac.compare_digest(a, b)
+
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+class FbWebhookReceiver(GObject.GObject):
+    """ receives Graph API change notifications (webhooks) instead of
+        polling refresh_comments on every watched photo
+
+        Subscription challenges are answered when hub.verify_token
+        matches and payloads are only accepted with a valid
+        X-Hub-Signature(-256) for the app secret. Changes to a watched
+        photo emit photo-changed and, WINDOW ms later, an incremental
+        refresh_new_comments on that photo only, so its usual comment
+        signals follow.
+
+        start() serves the endpoint from a thread of its own; to mount it
+        on an existing HTTP server call handle_request() from there
+        instead. Either way signals are emitted from the main loop. """
+
+    WINDOW = 500
+    MAX_BODY_SIZE = 1024 * 1024
+
+    __gsignals__ = {
+        'notification-received': (GObject.SignalFlags.RUN_FIRST, None, ([object])),
+        'photo-changed': (GObject.SignalFlags.RUN_FIRST, None, ([object, str])),
+    }
+
+    def __init__(self, verify_token, app_secret, window=WINDOW):
+        GObject.GObject.__init__(self)
+        self._engine = FbTransferEngine.default()
+        self._verify_token = verify_token
+        self._app_secret = app_secret
+        self._window = window
+        self._photos = {}
+        self._changed = {}
+        self._flush_id = None
+        self._server = None
+
+    def watch(self, photo):
+        photo.check_created('watch')
+        self._photos[photo.fb_object_id] = photo
+
+    def unwatch(self, photo):
+        self._photos.pop(photo.fb_object_id, None)
+        self._changed.pop(photo.fb_object_id, None)
+
+    def watched_count(self):
+        return len(self._photos)
+
+    def start(self, port=0, address='127.0.0.1'):
+        """ returns the URL to subscribe with """
+        self._server = _FbWebhookServer((address, port), self)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return "http://%s:%d/" % self._server.server_address
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+
+        if self._flush_id is not None:
+            self._engine.source_remove(self._flush_id)
+            self._flush_id = None
+
+    def handle_request(self, method, path, headers, body):
+        """ returns the HTTP code and body to answer with, can be called
+            from any thread. headers are matched case insensitively """
+        headers = dict((k.lower(), v) for k, v in headers.items())
+
+        if method == 'GET':
+            return self._verify_subscription(path)
+        if method != 'POST':
+            return 405, ""
+
+        if not self._valid_signature(headers, body):
+            logging.debug("webhook: bad payload signature")
+            return 403, ""
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, ""
+
+        self._engine.idle_add_threadsafe(self._dispatch, payload)
+        return 200, ""
+
+    def _verify_subscription(self, path):
+        query = urlparse.parse_qs(urlparse.urlparse(path).query)
+        mode = query.get('hub.mode', [None])[0]
+        token = query.get('hub.verify_token', [""])[0]
+        challenge = query.get('hub.challenge', [""])[0]
+
+        if mode == 'subscribe' and \
+                _compare_digest(token, self._verify_token):
+            return 200, challenge
+        return 403, ""
+
+    def _valid_signature(self, headers, body):
+        for header, name, digest in SIGNATURE_HEADERS:
+            if header not in headers:
+                continue
+
+            signature = hmac.new(self._app_secret, body, digest).hexdigest()
+            expected = "%s=%s" % (name, signature)
+            return _compare_digest(str(headers[header]), expected)
+        return False
+
+    def _dispatch(self, payload):
+        entries = payload.get('entry', []) if isinstance(payload, dict) else []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            self.emit('notification-received', entry)
+
+            for change in entry.get('changes', []):
+                value = change.get('value')
+                if not isinstance(value, dict):
+                    continue
+                photo = self._watched_photo(value)
+                if photo is not None:
+                    self._photo_changed(photo, change.get('field', ""))
+        return False
+
+    def _watched_photo(self, value):
+        for field in OBJECT_ID_FIELDS:
+            object_id = value.get(field)
+            if object_id is None:
+                continue
+
+            # post and comment ids are often <owner id>_<object id>
+            object_id = str(object_id)
+            for candidate in (object_id, object_id.split('_')[-1]):
+                if candidate in self._photos:
+                    return self._photos[candidate]
+        return None
+
+    def _photo_changed(self, photo, field):
+        logging.debug("webhook: %s changed (%s)" % (photo.fb_object_id, field))
+        self.emit('photo-changed', photo, field)
+
+        # several notifications for a photo within the window, one fetch
+        self._changed[photo.fb_object_id] = photo
+        if self._flush_id is None:
+            self._flush_id = self._engine.timeout_add(self._window,
+                                                      self._flush_cb)
+
+    def _flush_cb(self):
+        self._flush_id = None
+        changed, self._changed = self._changed, {}
+        for photo in changed.values():
+            photo.refresh_new_comments()
+        return False
+
+
+class _FbWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("webhook: " + format % args)
+
+    def do_GET(self):
+        self._handle("")
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+
+        if length < 0 or length > FbWebhookReceiver.MAX_BODY_SIZE:
+            self._respond(413, "")
+            return
+
+        self._handle(self.rfile.read(length))
+
+    def _handle(self, body):
+        code, response = self.server.receiver.handle_request(
+            self.command, self.path, dict(self.headers.items()), body)
+        self._respond(code, response)
+
+    def _respond(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FbWebhookServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, receiver):
+        HTTPServer.__init__(self, server_address, _FbWebhookHandler)
+        self.receiver = receiver
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+#
+# Benchmarks create, add_comment and refresh_comments against the local
+# mock Graph API server at several concurrency levels and payload sizes.
+# Results are saved as JSON so runs of different versions can be compared:
+#
+#   ./benchmark.py --output before.json
+#   ./benchmark.py --output after.json --compare before.json
+#
+# Each configuration runs in a fresh process, against a mock server in a
+# process of its own, with an account whose rate limiter never holds
+# calls back.
+
+from gi.repository import GObject
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append("..")
+
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from facebook.fb_photo import FbPhoto
+from facebook.fb_retry import FbRateLimiter
+from fb_mock_server import FbMockGraph, FbMockServer
+
+
+# high enough for the limiter to never be what is measured
+UNLIMITED = 1000000
+
+
+class Benchmark():
+    def __init__(self, count, concurrency):
+        self._count = count
+        self._temp_files = []
+        limiter = FbRateLimiter(rate=UNLIMITED, burst=UNLIMITED,
+                                max_rate=UNLIMITED)
+        self._account = FbAccount('benchmark', max_concurrent=concurrency,
+                                  limiter=limiter)
+
+    def run(self, op, concurrency, payload, photo_id):
+        setup = getattr(self, '_setup_%s' % (op))
+        start_op = getattr(self, '_start_%s' % (op))
+        arg = setup(payload, photo_id)
+
+        latencies = []
+        state = {'started': 0, 'failed': 0}
+        loop = GObject.MainLoop()
+
+        def start_next():
+            if state['started'] >= self._count:
+                if len(latencies) + state['failed'] >= self._count:
+                    loop.quit()
+                return
+            state['started'] += 1
+            started = time.time()
+
+            def done_cb(ok):
+                if ok:
+                    latencies.append(time.time() - started)
+                else:
+                    state['failed'] += 1
+                start_next()
+
+            start_op(arg, done_cb)
+
+        def kick_off():
+            for i in range(concurrency):
+                start_next()
+            return False
+
+        began = time.time()
+        GObject.idle_add(kick_off)
+        loop.run()
+        elapsed = time.time() - began
+
+        latencies.sort()
+        return {
+            'op': op,
+            'concurrency': concurrency,
+            'payload': payload,
+            'count': self._count,
+            'failed': state['failed'],
+            'throughput': len(latencies) / elapsed if elapsed > 0 else 0,
+            'p50': _percentile(latencies, 50),
+            'p99': _percentile(latencies, 99),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    def cleanup(self):
+        for path in self._temp_files:
+            os.unlink(path)
+        self._temp_files = []
+
+    def _setup_create(self, payload, photo_id):
+        fd, path = tempfile.mkstemp(suffix='.png')
+        os.write(fd, os.urandom(payload))
+        os.close(fd)
+        self._temp_files.append(path)
+        return path
+
+    def _start_create(self, path, done_cb):
+        photo = FbPhoto(account=self._account)
+        photo.connect('photo-created', lambda p, i: done_cb(True))
+        photo.connect('photo-create-failed', lambda p, r: done_cb(False))
+        photo.create(path)
+
+    def _setup_add_comment(self, payload, photo_id):
+        return photo_id, "x" * payload
+
+    def _start_add_comment(self, arg, done_cb):
+        photo_id, message = arg
+        photo = FbPhoto(photo_id, self._account)
+        photo.connect('comment-added', lambda p, i: done_cb(True))
+        photo.connect('comment-add-failed', lambda p, r: done_cb(False))
+        photo.add_comment(message)
+
+    def _setup_refresh_comments(self, payload, photo_id):
+        return photo_id
+
+    def _start_refresh_comments(self, photo_id, done_cb):
+        photo = FbPhoto(photo_id, self._account)
+        photo.connect('comments-downloaded', lambda p, c: done_cb(True))
+        photo.connect('comments-download-failed', lambda p, r: done_cb(False))
+        photo.refresh_comments()
+
+
+def _serve(params, op, payload, conn):
+    """ the mock server, away from the interpreter lock of the benchmark.
+        Sends back its URL and the photo the op works on """
+    graph = FbMockGraph(latency=params.latency, bandwidth=params.bandwidth,
+                        error_rate=params.error_rate,
+                        page_size=params.page_size)
+    photo_id = None
+    if op != 'create':
+        photo_id = graph.create_photo()[1]['id']
+    if op == 'refresh_comments':
+        for i in range(payload):
+            graph.add_comment(photo_id, "comment %d" % (i))
+
+    server = FbMockServer(graph)
+    conn.send((server.start(), photo_id))
+    conn.recv()
+    server.stop()
+
+
+def _run_one(params, op, concurrency, payload):
+    conn, server_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve,
+                                     args=(params, op, payload, server_conn))
+    server.start()
+    url, photo_id = conn.recv()
+    FbObject.GRAPH_URL = url
+
+    benchmark = Benchmark(params.count, concurrency)
+    try:
+        return benchmark.run(op, concurrency, payload, photo_id)
+    finally:
+        benchmark.cleanup()
+        conn.send(None)
+        server.join()
+
+
+def _run_process(params, op, concurrency, payload):
+    """ ru_maxrss only grows, so every run gets a process of its own """
+    args = [sys.executable, os.path.abspath(__file__),
+            '--run', op, str(concurrency), str(payload),
+            '--count', str(params.count),
+            '--latency', str(params.latency),
+            '--bandwidth', str(params.bandwidth),
+            '--error-rate', str(params.error_rate),
+            '--page-size', str(params.page_size)]
+    if params.debug:
+        args.append('--debug')
+    output = subprocess.check_output(args)
+    return json.loads(output.splitlines()[-1])
+
+
+def _percentile(values, perc):
+    if len(values) == 0:
+        return None
+    index = min(len(values) - 1, int(round(perc / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def _version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always',
+                                        '--dirty']).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(results, previous):
+    old = dict(((r['op'], r['concurrency'], r['payload']), r)
+               for r in previous['results'])
+
+    print "%-18s %5s %9s %12s %12s" % ("op", "conc", "payload",
+                                       "throughput", "p99")
+    for r in results:
+        key = (r['op'], r['concurrency'], r['payload'])
+        if key not in old or not old[key]['throughput'] or r['p99'] is None \
+                or old[key]['p99'] is None:
+            continue
+        print "%-18s %5d %9d %+11.1f%% %+11.1f%%" % \
+            (r['op'], r['concurrency'], r['payload'],
+             100.0 * (r['throughput'] / old[key]['throughput'] - 1),
+             100.0 * (r['p99'] / old[key]['p99'] - 1))
+
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--count', type=int, default=100,
+                        help='operations per run')
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--ops', nargs='+',
+                        default=['create', 'add_comment', 'refresh_comments'])
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='server latency per request, in seconds')
+    parser.add_argument('--bandwidth', type=int, default=0,
+                        help='server bandwidth in bytes/s, 0 is unlimited')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=25)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='results of a previous run')
+    parser.add_argument('--run', nargs=3,
+                        metavar=('OP', 'CONCURRENCY', 'PAYLOAD'),
+                        help='run a single configuration, print its result')
+    return parser.parse_args()
+
+# bytes of image, characters of comment, comments in the thread
+PAYLOADS = {
+    'create': [16 * 1024, 1024 * 1024],
+    'add_comment': [16, 4096],
+    'refresh_comments': [10, 1000],
+}
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.run:
+        op, concurrency, payload = params.run
+        print json.dumps(_run_one(params, op, int(concurrency), int(payload)))
+        sys.exit(0)
+
+    results = []
+    for op in params.ops:
+        for payload in PAYLOADS[op]:
+            for concurrency in params.concurrency:
+                r = _run_process(params, op, concurrency, payload)
+                results.append(r)
+                print "%-18s conc %3d payload %8d: %7.1f ops/s " \
+                    "p50 %.4fs p99 %.4fs failed %d" % \
+                    (op, concurrency, payload, r['throughput'],
+                     r['p50'] or 0, r['p99'] or 0, r['failed'])
+
+    with open(params.output, 'w') as f:
+        json.dump({'version': _version(), 'time': time.time(),
+                   'results': results}, f, indent=2)
+
+    if params.compare:
+        with open(params.compare) as f:
+            _compare(results, json.load(f))
@@ -0,0 +1,374 @@
+#!/usr/bin/python
+#
+# A local stand-in for the parts of the Graph API facebook-gobject uses:
+# /me/photos, /me/videos, /{id}/comments and batch requests, with
+# configurable latency, bandwidth, error rate and page size.
+
+import cgi
+import hashlib
+import json
+import random
+import ssl
+import threading
+import time
+import urlparse
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+class FbMockGraph():
+    """ the server side state, shared by all handler threads """
+
+    def __init__(self, latency=0.0, bandwidth=0, error_rate=0.0,
+                 page_size=25):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._next_id = 1000
+        self._comments = {}
+        self._videos = {}
+        # resumable video uploads
+        self.video_chunk_size = 4096
+        self.fail_chunks = 0
+        self.chunk_failure = (500, 2, "Chunk lost")
+        self.video_transfers = 0
+        # photo creates answered with a 200 that has no id
+        self.bad_creates = 0
+
+    def new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return str(self._next_id)
+
+    def create_photo(self):
+        with self._lock:
+            if self.bad_creates > 0:
+                self.bad_creates -= 1
+                return 200, {'success': True}
+
+        photo_id = self.new_id()
+        with self._lock:
+            self._comments[photo_id] = []
+        return 200, {'id': photo_id}
+
+    def add_comment(self, photo_id, message):
+        with self._lock:
+            if photo_id not in self._comments:
+                return 400, self.error(100, "Unsupported post request")
+
+        comment_id = "%s_%s" % (photo_id, self.new_id())
+        comment = {
+            'id': comment_id,
+            'from': {'id': '1', 'name': 'Mock User'},
+            'message': message,
+            'created_time': time.strftime("%Y-%m-%dT%H:%M:%S+0000",
+                                          time.gmtime()),
+            'like_count': 0,
+        }
+        with self._lock:
+            self._comments[photo_id].append(comment)
+        return 200, {'id': comment_id}
+
+    def comments(self, photo_id, query):
+        with self._lock:
+            if photo_id not in self._comments:
+                return 400, self.error(100, "Unsupported get request")
+            comments = list(self._comments[photo_id])
+
+        limit = int(query.get('limit', [self.page_size])[0])
+        start = 0
+        if 'after' in query:
+            start = int(query['after'][0]) + 1
+
+        page = comments[start:start + limit]
+        response = {'data': page, 'paging': {}}
+        if len(page) > 0:
+            last = start + len(page) - 1
+            response['paging']['cursors'] = {'before': str(start),
+                                             'after': str(last)}
+            if last + 1 < len(comments):
+                response['paging']['next'] = "next"
+        return 200, response
+
+    def photo(self, photo_id):
+        with self._lock:
+            if photo_id not in self._comments:
+                return None
+            comments = list(self._comments[photo_id])
+
+        return {'id': photo_id, 'name': "Photo %s" % (photo_id),
+                'created_time': "2012-05-01T10:00:00+0000",
+                'comments': {'data': comments},
+                'likes': {'data': [], 'summary': {'total_count': 0}}}
+
+    def node(self, node_id):
+        """ me (with all photos in one album) or a photo """
+        if node_id != 'me':
+            return self.photo(node_id)
+
+        with self._lock:
+            photo_ids = sorted(self._comments)
+        album = {'id': '1', 'name': "Mock Album", 'count': len(photo_ids),
+                 'photos': {'data': [self.photo(p) for p in photo_ids]}}
+        return {'id': '1', 'name': "Mock User",
+                'albums': {'data': [album]},
+                'friends': {'data': [{'id': '2', 'name': "Mock Friend"}]},
+                'statuses': {'data': []}}
+
+    def likes(self, photo_id):
+        if self.photo(photo_id) is None:
+            return 400, self.error(100, "Unsupported get request")
+        return 200, {'data': [], 'summary': {'total_count': 0}}
+
+    def video_phase(self, query, chunk):
+        """ the start, transfer and finish phases of a video upload """
+        phase = query.get('upload_phase', [''])[0]
+
+        if phase == 'start':
+            session_id = self.new_id()
+            video_id = self.new_id()
+            size = int(query.get('file_size', ['0'])[0])
+            with self._lock:
+                self._videos[session_id] = {'id': video_id, 'size': size,
+                                            'data': ""}
+            return 200, {'upload_session_id': session_id,
+                         'video_id': video_id,
+                         'start_offset': "0",
+                         'end_offset': str(min(size, self.video_chunk_size))}
+
+        session_id = query.get('upload_session_id', [''])[0]
+        with self._lock:
+            video = self._videos.get(session_id)
+        if video is None:
+            return 400, self.error(6000, "Unknown upload session")
+
+        if phase == 'transfer':
+            with self._lock:
+                self.video_transfers += 1
+                if self.fail_chunks > 0:
+                    self.fail_chunks -= 1
+                    status, code, message = self.chunk_failure
+                    return status, self.error(code, message)
+
+                start = int(query.get('start_offset', ['0'])[0])
+                if start != len(video['data']) or chunk is None:
+                    return 400, self.error(6001, "Bad start offset")
+                video['data'] += chunk
+
+                start = len(video['data'])
+                end = min(video['size'], start + self.video_chunk_size)
+            return 200, {'start_offset': str(start), 'end_offset': str(end)}
+
+        if phase == 'finish':
+            return 200, {'success': len(video['data']) == video['size']}
+
+        return 400, self.error(100, "Unknown upload phase")
+
+    def video_data(self, video_id):
+        with self._lock:
+            for video in self._videos.values():
+                if video['id'] == video_id:
+                    return video['data']
+        return None
+
+    def error(self, code, message):
+        return {'error': {'message': message, 'type': 'OAuthException',
+                          'code': code}}
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+def _parse_fields(fields):
+    """ a Graph fields selection as {name: nested selection or None},
+        modifiers like .limit(n) are ignored """
+    selection = {}
+    name, depth, start = None, 0, 0
+    for i, ch in enumerate(fields + ','):
+        if ch == '{':
+            if depth == 0:
+                name, start = fields[start:i], i + 1
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                selection[name.split('.')[0]] = _parse_fields(fields[start:i])
+        elif ch == ',' and depth == 0:
+            if name is None and fields[start:i]:
+                selection[fields[start:i].split('.')[0]] = None
+            start, name = i + 1, None
+    return selection
+
+
+def _select(node, selection):
+    result = {}
+    for name, nested in selection.items():
+        if name not in node:
+            continue
+        value = node[name]
+        if nested is not None and isinstance(value, dict) and 'data' in value:
+            value = dict(value)
+            value['data'] = [_select(item, nested) for item in value['data']]
+        result[name] = value
+    return result
+
+
+class FbMockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        graph = self.server.graph
+        url = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(url.query)
+        parts = url.path.strip('/').split('/')
+
+        if not self._begin(query):
+            return
+
+        if len(parts) == 2 and parts[1] == 'comments':
+            code, response = graph.comments(parts[0], query)
+        elif len(parts) == 2 and parts[1] == 'likes':
+            code, response = graph.likes(parts[0])
+        elif len(parts) == 1 and graph.node(parts[0]) is not None:
+            code, response = 200, graph.node(parts[0])
+            if 'fields' in query:
+                response = _select(response, _parse_fields(query['fields'][0]))
+        else:
+            code, response = 400, graph.error(100, "Unknown path")
+
+        self._respond(code, response, etag=True)
+
+    def do_POST(self):
+        graph = self.server.graph
+        form = cgi.FieldStorage(fp=self.rfile, headers=self.headers,
+                                environ={'REQUEST_METHOD': 'POST'})
+        query = dict((k, [form.getfirst(k)]) for k in form.keys()
+                     if not form[k].filename)
+        parts = urlparse.urlparse(self.path).path.strip('/').split('/')
+
+        if not self._begin(query):
+            return
+
+        if parts == ['']:
+            code, response = self._batch(json.loads(query['batch'][0]))
+        elif parts == ['me', 'photos'] and 'source' in form:
+            code, response = graph.create_photo()
+        elif parts == ['me', 'videos']:
+            chunk = None
+            if 'video_file_chunk' in form:
+                chunk = form['video_file_chunk'].value
+            code, response = graph.video_phase(query, chunk)
+        elif len(parts) == 2 and parts[1] == 'comments':
+            code, response = graph.add_comment(parts[0],
+                                               query.get('message', [''])[0])
+        else:
+            code, response = 400, graph.error(100, "Unknown path")
+
+        self._respond(code, response)
+
+    def _batch(self, requests):
+        graph = self.server.graph
+        responses = []
+        for request in requests:
+            url = urlparse.urlparse(request['relative_url'])
+            parts = url.path.strip('/').split('/')
+            if request['method'] == 'GET' and parts[1:] == ['comments']:
+                query = urlparse.parse_qs(url.query)
+                code, body = graph.comments(parts[0], query)
+            elif request['method'] == 'POST' and parts[1:] == ['comments']:
+                query = urlparse.parse_qs(request.get('body', ''))
+                code, body = graph.add_comment(parts[0],
+                                               query.get('message', [''])[0])
+            else:
+                code, body = 400, graph.error(100, "Unknown path")
+            responses.append({'code': code, 'headers': [],
+                              'body': json.dumps(body)})
+        return 200, responses
+
+    def _begin(self, query):
+        graph = self.server.graph
+        graph.requests += 1
+
+        if graph.latency > 0:
+            time.sleep(graph.latency)
+
+        if 'access_token' not in query:
+            self._respond(400, graph.error(190, "No access token"))
+            return False
+
+        if graph.should_fail():
+            self._respond(500, graph.error(2, "Service temporarily unavailable"))
+            return False
+
+        return True
+
+    def _respond(self, code, response, etag=False):
+        body = json.dumps(response)
+
+        tag = None
+        if etag and code == 200:
+            tag = '"%s"' % (hashlib.md5(body).hexdigest())
+            if self.headers.get('If-None-Match') == tag:
+                self.send_response(304)
+                self.send_header('ETag', tag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if tag is not None:
+            self.send_header('ETag', tag)
+        self.end_headers()
+        self._write(body)
+
+    def _write(self, body):
+        bandwidth = self.server.graph.bandwidth
+        if bandwidth <= 0:
+            self.wfile.write(body)
+            return
+
+        chunk = max(1, bandwidth / 10)
+        for i in range(0, len(body), chunk):
+            self.wfile.write(body[i:i + chunk])
+            time.sleep(float(len(body[i:i + chunk])) / bandwidth)
+
+
+class FbMockServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, graph=None, port=0, certfile=None):
+        HTTPServer.__init__(self, ('127.0.0.1', port), FbMockHandler)
+        self.graph = graph if graph is not None else FbMockGraph()
+        self.scheme = "http"
+        if certfile is not None:
+            self.socket = ssl.wrap_socket(self.socket, certfile=certfile,
+                                          server_side=True)
+            self.scheme = "https"
+        self._thread = None
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def url(self):
+        return "%s://127.0.0.1:%d" % (self.scheme, self.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self.url()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+import argparse
+import logging
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook import fb_async
+from facebook.fb_account import FbAccount
+from facebook.fb_error import FbRequestFailed
+from facebook.fb_object import FbObject
+from facebook.fb_photo import FbPhoto
+from fb_mock_server import FbMockServer
+
+
+class TestFbAsync(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30
+    photo_path = 'test.png'
+
+    def _run(self, future):
+        loop = fb_async.asyncio.get_event_loop()
+        return loop.run_until_complete(
+            fb_async.asyncio.wait_for(future, self.PER_TEST_TIMEOUT))
+
+    def test_create_photo(self):
+        photo_id = self._run(FbPhoto().create_async(self.photo_path))
+        logging.debug("Photo created: %s" % (photo_id))
+        self.assertTrue(photo_id)
+
+    def test_fetch_comments(self):
+        photo_id = self._run(FbPhoto().create_async(self.photo_path))
+        self._run(FbPhoto(photo_id).add_comment_async("this is a test"))
+
+        comments = self._run(FbPhoto(photo_id).fetch_comments())
+        self.assertEqual(comments[0]['message'], "this is a test")
+
+    def test_comment_pages(self):
+        photo_id = self._run(FbPhoto().create_async(self.photo_path))
+        for i in range(3):
+            self._run(FbPhoto(photo_id).add_comment_async("comment %d" % i))
+
+        pages = FbPhoto(photo_id).comment_pages()
+        count = 0
+        while True:
+            try:
+                count += len(self._run(pages.__anext__()))
+            except fb_async.StopAsyncIteration:
+                break
+        self.assertEqual(count, 3)
+
+    def test_failure(self):
+        photo = FbPhoto('0')
+        self.assertRaises(FbRequestFailed, self._run, photo.fetch_comments())
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    fb_async.use_asyncio()
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_async'])
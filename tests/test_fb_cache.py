@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+import argparse
+import logging
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_cache import FbResponseCache
+
+
+class TestFbResponseCache(unittest.TestCase):
+    def setUp(self):
+        self._cache = FbResponseCache(max_entries=10, max_bytes=1000,
+                                      max_entry_bytes=400)
+
+    def test_revalidation_headers(self):
+        self._cache.store('a', '"tag"', None, "x" * 10)
+        self.assertEqual(self._cache.request_headers('a'),
+                         ['If-None-Match: "tag"'])
+
+        # nothing to answer a 304 with yet
+        self._cache.store('b', '"tag"', None)
+        self.assertEqual(self._cache.request_headers('b'), [])
+        self._cache.set_value('b', [1, 2, 3], 30)
+        self.assertEqual(self._cache.request_headers('b'),
+                         ['If-None-Match: "tag"'])
+
+    def test_evict_by_size(self):
+        for key in ('a', 'b', 'c'):
+            self._cache.store(key, '"tag"', None, "x" * 300)
+        self.assertEqual(self._cache.size(), 900)
+
+        # a is the least recently used once b and c are looked at
+        self._cache.get('b')
+        self._cache.store('d', '"tag"', None, "x" * 300)
+        self.assertEqual(self._cache.get('a'), None)
+        self.assertNotEqual(self._cache.get('b'), None)
+        self.assertEqual(self._cache.size(), 900)
+
+        self._cache.store('e', '"tag"', None)
+        self._cache.set_value('e', "value", 350)
+        self.assertEqual(len(self._cache), 3)
+        self.assertTrue(self._cache.size() <= 1000)
+        self.assertEqual(self._cache.get('c'), None)
+
+    def test_entry_too_big(self):
+        self.assertEqual(self._cache.store('a', '"tag"', None, "x" * 500),
+                         None)
+        self.assertEqual(self._cache.get('a'), None)
+
+        self._cache.store('b', '"tag"', None)
+        self.assertEqual(self._cache.set_value('b', "value", 500), None)
+        self.assertEqual(self._cache.get('b'), None)
+        self.assertEqual(self._cache.size(), 0)
+
+    def test_replace_and_remove(self):
+        self._cache.store('a', '"1"', None, "x" * 100)
+        self._cache.store('a', '"2"', None, "x" * 200)
+        self.assertEqual(self._cache.size(), 200)
+        self._cache.remove('a')
+        self.assertEqual(self._cache.size(), 0)
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='ignored, these tests make no calls')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='ignored, these tests make no calls')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    unittest.main(argv=['test_fb_cache'])
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_image import FbImageOptimizer, Image
+from facebook.fb_photo import FbPhoto
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from fb_mock_server import FbMockServer
+
+
+class TestFbImage(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    MAX_DIMENSION = 512
+
+    def setUp(self):
+        if not FbImageOptimizer.available():
+            self.skipTest("PIL is not available")
+
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+
+        # the optimised copies are written to the temporary directory
+        self._dir = tempfile.mkdtemp()
+        self._tempdir = tempfile.tempdir
+        tempfile.tempdir = self._dir
+
+        self._image_path = os.path.join(self._dir, "source.jpg")
+        image = Image.effect_noise((1600, 1200), 64).convert('RGB')
+        image.save(self._image_path, 'JPEG', quality=100)
+
+        self._optimizer = FbImageOptimizer(max_dimension=self.MAX_DIMENSION)
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+        self._optimizer.close()
+        tempfile.tempdir = self._tempdir
+        shutil.rmtree(self._dir)
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def _optimized_copies(self):
+        return [name for name in os.listdir(self._dir)
+                if name.startswith('fb-')]
+
+    def test_optimized_size(self):
+        def optimized_cb(path, temporary):
+            self.assertTrue(temporary)
+            self.assertTrue(os.path.getsize(path) <
+                            os.path.getsize(self._image_path))
+            self.assertTrue(max(Image.open(path).size) <= self.MAX_DIMENSION)
+            self._optimizer.cleanup(path)
+            self._finish_test()
+
+        self._optimizer.optimize(self._image_path, optimized_cb)
+        self._loop.run()
+        assert(self._completed)
+        self.assertEqual(self._optimized_copies(), [])
+
+    def test_cleanup_after_created(self):
+        def photo_created_cb(photo, photo_id):
+            self.assertEqual(self._optimized_copies(), [])
+            self._finish_test()
+
+        photo = FbPhoto()
+        photo.set_optimizer(self._optimizer)
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self._image_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_cleanup_after_failed(self):
+        graph_url = FbObject.GRAPH_URL
+
+        def photo_create_failed_cb(photo, reason):
+            logging.debug("Photo create failed: %s" % (reason))
+            self.assertEqual(self._optimized_copies(), [])
+            self._finish_test()
+
+        # nothing listens there
+        FbObject.GRAPH_URL = "http://127.0.0.1:1"
+
+        photo = FbPhoto()
+        photo.set_optimizer(self._optimizer)
+        photo.connect('photo-create-failed', photo_create_failed_cb)
+        photo.create(self._image_path)
+        self._loop.run()
+        FbObject.GRAPH_URL = graph_url
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_image'])
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_journal import FbWriteJournal
+from facebook.fb_photo import FbPhoto
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from fb_mock_server import FbMockServer
+
+
+# bad responses are injected by the mock server
+server = None
+
+
+class TestFbJournal(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    photo_path = 'test.png'
+
+    def setUp(self):
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+        self._dir = tempfile.mkdtemp()
+        self._journal_path = os.path.join(self._dir, "journal")
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+        shutil.rmtree(self._dir)
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def test_comment_waits_for_create(self):
+        events = []
+        def photo_created_cb(photo, photo_id):
+            events.append('photo-created')
+
+        def comment_added_cb(photo, comment_id):
+            events.append('comment-added')
+
+        def finished_cb(journal, done, failed):
+            logging.debug("%d writes done, %d failed" % (done, failed))
+            self.assertEqual((done, failed), (2, 0))
+            self.assertEqual(events, ['photo-created', 'comment-added'])
+            journal.close()
+            self._finish_test()
+
+        journal = FbWriteJournal(self._journal_path)
+        journal.connect('finished', finished_cb)
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.connect('comment-added', comment_added_cb)
+        journal.create(photo, self.photo_path)
+        journal.add_comment(photo, "journaled comment")
+        self._loop.run()
+        assert(self._completed)
+
+    def test_replay_after_outage(self):
+        graph_url = FbObject.GRAPH_URL
+
+        def finished_cb(journal, done, failed):
+            self.assertEqual((done, failed), (2, 0))
+            journal.close()
+            self._finish_test()
+
+        def photo_create_failed_cb(photo, reason, journal):
+            logging.debug("create failed while offline: %s" % (reason))
+            self.assertEqual(journal.pending_count(), 2)
+            journal.close()
+
+            # as if the process had restarted with the network back
+            FbObject.GRAPH_URL = graph_url
+            journal = FbWriteJournal(self._journal_path)
+            journal.connect('finished', finished_cb)
+
+        # nothing listens there
+        FbObject.GRAPH_URL = "http://127.0.0.1:1"
+
+        journal = FbWriteJournal(self._journal_path)
+        photo = FbPhoto()
+        photo.connect('photo-create-failed', photo_create_failed_cb, journal)
+        journal.create(photo, self.photo_path)
+        journal.add_comment(photo, "written while offline")
+        self._loop.run()
+        FbObject.GRAPH_URL = graph_url
+        assert(self._completed)
+
+    def test_bad_response_after_outage(self):
+        if server is None:
+            self.skipTest("needs --mock")
+        graph_url = FbObject.GRAPH_URL
+
+        def finished_cb(journal, done, failed):
+            # a bad response is final, even after a network failure
+            self.assertEqual((done, failed), (0, 2))
+            journal.close()
+            self._finish_test()
+
+        def photo_create_failed_cb(photo, reason, journal):
+            if FbObject.GRAPH_URL == graph_url:
+                return
+            FbObject.GRAPH_URL = graph_url
+            server.graph.bad_creates = 1
+            # once the journal has seen the failure too
+            GObject.idle_add(journal.flush)
+
+        FbObject.GRAPH_URL = "http://127.0.0.1:1"
+
+        journal = FbWriteJournal(self._journal_path)
+        journal.connect('finished', finished_cb)
+        photo = FbPhoto()
+        photo.connect('photo-create-failed', photo_create_failed_cb, journal)
+        journal.create(photo, self.photo_path)
+        journal.add_comment(photo, "written while offline")
+        self._loop.run()
+        FbObject.GRAPH_URL = graph_url
+        assert(self._completed)
+
+    def test_comment_on_failed_create(self):
+        if server is None:
+            self.skipTest("needs --mock")
+        failures = []
+
+        def photo_comment_failed_cb(photo, reason):
+            failures.append(('photo', reason))
+
+        def journal_comment_failed_cb(journal, write_id, reason):
+            failures.append(('journal', write_id))
+
+        def finished_cb(journal, done, failed):
+            self.assertEqual((done, failed), (0, 2))
+            self.assertEqual(failures, [('photo', "Photo create failed"),
+                                        ('journal', str(comment_id))])
+            journal.close()
+            self._finish_test()
+
+        server.graph.bad_creates = 1
+
+        journal = FbWriteJournal(self._journal_path)
+        journal.connect('comment-add-failed', journal_comment_failed_cb)
+        journal.connect('finished', finished_cb)
+        photo = FbPhoto()
+        photo.connect('comment-add-failed', photo_comment_failed_cb)
+        journal.create(photo, self.photo_path)
+        comment_id = journal.add_comment(photo, "never possible")
+        self._loop.run()
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_journal'])
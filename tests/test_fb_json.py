@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import logging
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_error import FbBadCall
+from facebook.fb_json import FbJsonStream
+
+
+RESPONSE = json.dumps({
+    'data': [
+        {'id': '1_1', 'from': {'name': 'Ana', 'id': '7'},
+         'message': u'café "quoted" {not} [a], \\ brace',
+         'like_count': 12345, 'created_time': '2012-05-01T10:00:00+0000'},
+        {'id': '1_2', 'from': {'name': u'José', 'id': '8'},
+         'message': 'data', 'like_count': -1.5e3, 'tags': [[1, 2], []]},
+    ],
+    'paging': {'cursors': {'before': 'MQ==', 'after': 'Mg=='},
+               'next': 'https://graph.facebook.com/1/comments?after=Mg=='},
+    'summary': {'total_count': 2, 'data': 'not the items'},
+}, sort_keys=True)
+
+
+class TestFbJsonStream(unittest.TestCase):
+    def _parse(self, bufs, max_size=0):
+        items = []
+        parser = FbJsonStream('data', items.append, max_size)
+        for buf in bufs:
+            if parser.feed(buf) == 0:
+                break
+        return parser, items
+
+    def _check(self, bufs):
+        parser, items = self._parse(bufs)
+        expected = json.loads(RESPONSE)
+        self.assertEqual(items, expected['data'])
+
+        expected['data'] = []
+        self.assertEqual(parser.finish(), expected)
+
+    def test_whole(self):
+        self._check([RESPONSE])
+
+    def test_split_anywhere(self):
+        # inside keys, strings, escapes, \u sequences and numbers
+        for i in range(len(RESPONSE) + 1):
+            self._check([RESPONSE[:i], RESPONSE[i:]])
+
+    def test_byte_by_byte(self):
+        self._check(list(RESPONSE))
+
+    def test_max_size(self):
+        parser, items = self._parse([RESPONSE[:100], RESPONSE[100:]], 150)
+        self.assertEqual(parser.feed("{}"), 0)
+        self.assertNotEqual(parser.error, None)
+        self.assertRaises(FbBadCall, parser.finish)
+
+    def test_no_items(self):
+        error = json.dumps({'error': {'message': 'oops', 'code': 100}})
+        parser, items = self._parse([error])
+        self.assertEqual(items, [])
+        self.assertRaises(FbBadCall, parser.finish)
+
+    def test_malformed(self):
+        # a good first element, then garbage
+        cut = RESPONSE.index('}, {') + 3
+        body = RESPONSE[:cut] + '{"id": "1_2", "message": ]}'
+        parser, items = self._parse([body])
+        self.assertEqual(len(items), 1)
+        self.assertNotEqual(parser.error, None)
+        self.assertRaises(FbBadCall, parser.finish)
+
+        parser, items = self._parse([RESPONSE[:len(RESPONSE) / 2]])
+        self.assertRaises(FbBadCall, parser.finish)
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='ignored, these tests make no calls')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='ignored, these tests make no calls')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    unittest.main(argv=['test_fb_json'])
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_album import FbAlbum
+from facebook.fb_batch import FbBatch
+from facebook.fb_error import FbBadCall
+from facebook.fb_fields import expand
+from facebook.fb_me import FbMe
+from facebook.fb_photo import FbPhoto
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from fb_mock_server import FbMockServer
+
+
+class TestFbMe(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    photo_path = 'test.png'
+
+    def setUp(self):
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def test_expand_fields(self):
+        likes = expand('likes', summary=True)
+        self.assertEqual(expand('photos', ['id', likes], limit=25),
+                         "photos.limit(25){id,likes.summary(true)}")
+
+    def test_fetch_untyped(self):
+        self.assertRaises(FbBadCall, FbObject('1').fetch)
+
+        batch = FbBatch()
+        batch.fb_object_id = '1'
+        self.assertRaises(FbBadCall, batch.fetch)
+
+    def test_fetch_albums(self):
+        def photo_created_cb(photo, photo_id):
+            logging.debug("Photo created: %s" % (photo_id))
+            photo.connect('comment-added', comment_added_cb)
+            photo.add_comment("nested comment")
+            return False
+
+        def comment_added_cb(photo, comment_id):
+            fields = ['name',
+                      expand('albums', FbAlbum.DEFAULT_FIELDS +
+                             [FbAlbum.photos_fields(comments=True,
+                                                    likes=True)])]
+            me = FbMe()
+            me.connect('fetched', fetched_cb, photo.fb_object_id)
+            me.fetch(fields)
+
+        def fetched_cb(me, data, photo_id):
+            photos = [p for album in me.albums() for p in album.photos()]
+            photo = [p for p in photos if p.fb_object_id == photo_id][0]
+            self.assertEqual(photo.comments()[0]['message'], "nested comment")
+            self.assertEqual(photo.like_count(), 0)
+            self._finish_test()
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_likes_downloaded(self):
+        def photo_created_cb(photo, photo_id):
+            photo.connect('likes-downloaded', likes_downloaded_cb)
+            photo.refresh_likes()
+            return False
+
+        def likes_downloaded_cb(photo, likes):
+            logging.debug("%d likes" % (photo.like_count()))
+            self.assertEqual(photo.like_count(), len(likes))
+            self._finish_test()
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_me'])
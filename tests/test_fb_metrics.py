@@ -0,0 +1,132 @@
+#!/usr/bin/python
+
+import argparse
+import json
+import logging
+import sys
+import unittest
+
+sys.path.append("..")
+
+import pycurl
+
+from facebook import fb_types
+from facebook.fb_metrics import FbHistogram, FbMetrics, endpoint_from_url, \
+    transfer_stats
+
+
+def _stats(total, starttransfer, bytes_up=0, bytes_down=0):
+    return {'total': total, 'starttransfer': starttransfer,
+            'bytes_up': bytes_up, 'bytes_down': bytes_down}
+
+
+class FakeCurl():
+    """ answers getinfo() like a finished transfer would """
+
+    TOTAL_TIME = pycurl.TOTAL_TIME
+    SIZE_DOWNLOAD = pycurl.SIZE_DOWNLOAD
+
+    def getinfo(self, info):
+        return {pycurl.TOTAL_TIME: 0.5, pycurl.SIZE_DOWNLOAD: 1024.0}[info]
+
+
+class TestFbMetrics(unittest.TestCase):
+    def test_endpoint_from_url(self):
+        url = "https://graph.facebook.com"
+        self.assertEqual(endpoint_from_url(url + "/123/comments?a=1"),
+                         "/{id}/comments")
+        self.assertEqual(endpoint_from_url(url + "/123_456/likes"),
+                         "/{id}/likes")
+        self.assertEqual(endpoint_from_url(url + "/123"), "/{id}")
+        self.assertEqual(endpoint_from_url(url + "/me/photos"), "/me/photos")
+        self.assertEqual(endpoint_from_url(url + "/v2.0/me"), "/v2.0/me")
+        self.assertEqual(endpoint_from_url(url), "/")
+
+    def test_transfer_stats(self):
+        stats = transfer_stats(FakeCurl())
+        self.assertEqual(stats['total'], 0.5)
+        self.assertEqual(stats['bytes_down'], 1024.0)
+        # what the handle can't tell is 0
+        self.assertEqual(stats['connect'], 0.0)
+
+    def test_histogram(self):
+        histogram = FbHistogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 5.65)
+
+    def test_record_and_dump(self):
+        metrics = FbMetrics()
+        metrics.record("/{id}/comments", fb_types.FB_COMMENT,
+                       _stats(0.2, 0.1, 10, 1000), fb_types.FB_ERROR_NONE)
+        metrics.record("/{id}/comments", fb_types.FB_COMMENT,
+                       _stats(0.3, 0.2, 10, 0), fb_types.FB_ERROR_THROTTLED)
+        metrics.record("/me/photos", fb_types.FB_PHOTO,
+                       _stats(1.0, 0.9, 5000, 20), fb_types.FB_ERROR_NONE)
+
+        dump = metrics.dump()
+        json.dumps(dump)
+        self.assertEqual([m['endpoint'] for m in dump],
+                         ["/me/photos", "/{id}/comments"])
+
+        comments = dump[1]
+        self.assertEqual(comments['fb_type'], "Comment")
+        self.assertEqual(comments['requests'], 2)
+        self.assertEqual(comments['errors'], {"Rate limited": 1})
+        self.assertEqual(comments['bytes_up'], 20)
+        self.assertEqual(comments['bytes_down'], 1000)
+        self.assertEqual(comments['latency']['count'], 2)
+        self.assertAlmostEqual(comments['first_byte']['sum'], 0.3)
+
+        metrics.reset()
+        self.assertEqual(metrics.dump(), [])
+
+    def test_prometheus(self):
+        metrics = FbMetrics()
+        metrics.record("/{id}/comments", fb_types.FB_COMMENT,
+                       _stats(0.2, 0.07, 10, 1000), fb_types.FB_ERROR_SERVER)
+
+        lines = metrics.prometheus().splitlines()
+        labels = 'endpoint="/{id}/comments",fb_type="Comment"'
+        self.assertTrue('fb_requests_total{%s} 1' % (labels) in lines)
+        self.assertTrue('fb_errors_total{%s,error="Server error"} 1' % \
+                            (labels) in lines)
+        self.assertTrue('fb_bytes_down_total{%s} 1000' % (labels) in lines)
+        self.assertTrue('fb_latency_seconds_bucket{%s,le="0.1"} 0' % \
+                            (labels) in lines)
+        self.assertTrue('fb_latency_seconds_bucket{%s,le="0.25"} 1' % \
+                            (labels) in lines)
+        self.assertTrue('fb_first_byte_seconds_bucket{%s,le="0.1"} 1' % \
+                            (labels) in lines)
+        self.assertTrue('fb_latency_seconds_bucket{%s,le="+Inf"} 1' % \
+                            (labels) in lines)
+        self.assertTrue('fb_latency_seconds_count{%s} 1' % (labels) in lines)
+
+        # buckets are cumulative
+        buckets = [int(l.split()[-1]) for l in lines
+                   if l.startswith('fb_latency_seconds_bucket')]
+        self.assertEqual(buckets, sorted(buckets))
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='ignored, these tests make no calls')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='ignored, these tests make no calls')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    unittest.main(argv=['test_fb_metrics'])
@@ -10,8 +10,12 @@ import unittest
 
 sys.path.append("..")
 
+from facebook.fb_batch import FbBatch
 from facebook.fb_photo import FbPhoto
 from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from facebook.fb_scheduler import FbScheduler
+from fb_mock_server import FbMockServer
 
 
 class TestFbPhoto(unittest.TestCase):
@@ -96,6 +100,190 @@ class TestFbPhoto(unittest.TestCase):
         self._loop.run()
         assert(self._completed)
 
+    def test_cached_comments_unchanged(self):
+        refreshes = []
+        def photo_created_cb(photo, photo_id):
+            photo.connect('comment-added', comment_added_cb)
+            photo.add_comment("this is a test")
+            return False
+
+        def comment_added_cb(photo, comment_id):
+            photo.connect('comments-downloaded', comments_downloaded_cb)
+            photo.refresh_comments()
+
+        def comments_downloaded_cb(photo, comments):
+            refreshes.append(len(comments))
+            if len(refreshes) == 1:
+                # a handler changing its list mustn't affect the next one
+                comments.append_data({'id': 'x', 'from': {'name': 'x'},
+                                      'message': 'x', 'created_time': 'x'})
+                photo.refresh_comments()
+            else:
+                self.assertEqual(refreshes[1], 1)
+                self._finish_test()
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_refresh_then_new_comments(self):
+        added = []
+        def photo_created_cb(photo, photo_id):
+            photo.connect('comment-added', comment_added_cb)
+            photo.connect('comments-downloaded', comments_downloaded_cb)
+            photo.connect('comments-stream-completed', stream_completed_cb)
+            photo.add_comment("seen by refresh_comments")
+            return False
+
+        def comment_added_cb(photo, comment_id):
+            added.append(comment_id)
+            if len(added) == 1:
+                photo.refresh_comments()
+            else:
+                photo.refresh_new_comments()
+
+        def comments_downloaded_cb(photo, comments):
+            photo.add_comment("only this one is new")
+
+        def stream_completed_cb(photo, count):
+            self.assertEqual(count, 1)
+            self._finish_test()
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_shared_refresh(self):
+        transfers = []
+        downloads = []
+        def photo_created_cb(photo, photo_id):
+            photo.connect('comment-added', comment_added_cb)
+            photo.add_comment("this is a test")
+            return False
+
+        def comment_added_cb(photo, comment_id):
+            # both GETs are the same, only one of them goes out
+            for i in range(2):
+                photo = FbPhoto(photo.fb_object_id)
+                photo.connect('transfer-stats', transfer_stats_cb)
+                photo.connect('comments-downloaded', comments_downloaded_cb)
+                photo.refresh_comments()
+
+        def transfer_stats_cb(photo, stats):
+            transfers.append(stats)
+
+        def comments_downloaded_cb(photo, comments):
+            downloads.append(photo)
+            if len(downloads) == 2:
+                self.assertEqual(len(transfers), 1)
+                self.assertNotEqual(downloads[0], downloads[1])
+                self._finish_test()
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_stream_comments(self):
+        pages = []
+        def photo_created_cb(photo, photo_id, callback):
+            logging.debug("Photo created: %s" % (photo_id))
+
+            def comment_added_cb(photo, comment_id, callback):
+                logging.debug("Comment created: %s" % (comment_id))
+
+                def page_downloaded_cb(photo, comments):
+                    pages.append(comments)
+
+                def stream_completed_cb(photo, count, callback):
+                    logging.debug("%d comments streamed in %d pages",
+                                  count, len(pages))
+                    if count > 0:
+                        callback()
+
+                photo.connect('comments-page-downloaded', page_downloaded_cb)
+                photo.connect('comments-stream-completed',
+                              stream_completed_cb,
+                              callback)
+                photo.stream_comments()
+                return False
+
+            photo = FbPhoto(photo_id)
+            photo.connect("comment-added", comment_added_cb, callback)
+            photo.add_comment("this is a test")
+            return False
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb, self._finish_test)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_batch_add_comments(self):
+        comments = []
+        def photo_created_cb(photo, photo_id, callback):
+            logging.debug("Photo created: %s" % (photo_id))
+
+            def comment_added_cb(photo, comment_id, callback):
+                logging.debug("Comment created: %s" % (comment_id))
+                comments.append(comment_id)
+                if len(comments) == 3:
+                    callback()
+                return False
+
+            batch = FbBatch()
+            for i in range(3):
+                photo = FbPhoto(photo_id)
+                photo.set_batch(batch)
+                photo.connect("comment-added", comment_added_cb, callback)
+                photo.add_comment("batched comment %d" % (i))
+            return False
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb, self._finish_test)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_account_budget(self):
+        account = FbAccount(FbAccount.access_token(), max_concurrent=1)
+        comments = []
+        running = []
+        def photo_created_cb(photo, photo_id, callback):
+            logging.debug("Photo created: %s" % (photo_id))
+
+            def transfer_started_cb(photo, fb_type, transfer_type):
+                # sampled while the transfers run, not once they are done
+                scheduler = FbScheduler.default()
+                running.append(scheduler.running_count(account))
+
+            def comment_added_cb(photo, comment_id, callback):
+                logging.debug("Comment created: %s" % (comment_id))
+                comments.append(comment_id)
+                if len(comments) == 3:
+                    self.assertEqual(len(running), 3)
+                    self.assertEqual(max(running), 1)
+                    callback()
+                return False
+
+            for i in range(3):
+                photo = FbPhoto(photo_id, account)
+                photo.connect("transfer-started", transfer_started_cb)
+                photo.connect("comment-added", comment_added_cb, callback)
+                photo.add_comment("comment %d" % (i))
+            return False
+
+        photo = FbPhoto(account=account)
+        photo.connect('photo-created', photo_created_cb, self._finish_test)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
     def test_transfer_state_changed(self):
         states = []
         states_started = []
@@ -133,7 +321,12 @@ def _get_params():
     parser.add_argument('--debug',
                         type=bool,
                         default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
     parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
                         help='token to run the tests with')
     parser.add_argument('test_name',
                         nargs='?',
@@ -146,5 +339,9 @@ if __name__ == '__main__':
     if params.debug:
         logging.basicConfig(level=logging.DEBUG)
 
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
     FbAccount.set_access_token(params.access_token)
     unittest.main(argv=['test_fb_photo'])
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from facebook.fb_photo import FbPhoto
+from facebook.fb_pool import FbConnectionPool
+from fb_mock_server import FbMockServer
+
+
+# the connections are counted by the mock server
+server = None
+
+
+class TestFbConnectionPool(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    IDLE_TIMEOUT = 1
+    photo_path = 'test.png'
+
+    def setUp(self):
+        if server is None:
+            self.skipTest("needs --mock")
+
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+        FbConnectionPool.configure(idle_timeout=self.IDLE_TIMEOUT)
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+        FbConnectionPool.configure()
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def test_reuse_and_expiry(self):
+        connections = server.connections
+        comments = []
+        def photo_created_cb(photo, photo_id):
+            photo.connect('comment-added', comment_added_cb)
+            photo.add_comment("over the same connection")
+            return False
+
+        def comment_added_cb(photo, comment_id):
+            comments.append(comment_id)
+            if len(comments) == 1:
+                self.assertEqual(server.connections - connections, 1)
+                GObject.timeout_add((self.IDLE_TIMEOUT + 1) * 1000,
+                                    add_comment, photo)
+            else:
+                self.assertEqual(server.connections - connections, 2)
+                self._finish_test()
+
+        def add_comment(photo):
+            photo.add_comment("over a new connection")
+            return False
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_pool'])
@@ -0,0 +1,107 @@
+#!/usr/bin/python
+
+import argparse
+import logging
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_progress import FbProgress, FbTransferGroup
+
+
+class TestFbProgress(unittest.TestCase):
+    def test_states(self):
+        progress = FbProgress(min_interval=0, min_delta=0)
+        self.assertEqual(progress.update(100, 0), FbProgress.STARTED)
+        self.assertTrue(progress.state_changed)
+        self.assertEqual(progress.update(100, 10), FbProgress.RUNNING)
+        self.assertTrue(progress.state_changed)
+        self.assertEqual(progress.update(100, 20), FbProgress.RUNNING)
+        self.assertFalse(progress.state_changed)
+        self.assertEqual(progress.update(100, 100), FbProgress.COMPLETED)
+        self.assertTrue(progress.state_changed)
+        self.assertEqual(progress.update(100, 100), None)
+
+    def test_min_interval(self):
+        progress = FbProgress(min_interval=3600, min_delta=0)
+        progress.update(100, 0)
+        self.assertEqual(progress.update(100, 10), FbProgress.RUNNING)
+        self.assertEqual(progress.update(100, 50), None)
+        # completion isn't held back
+        self.assertEqual(progress.update(100, 100), FbProgress.COMPLETED)
+
+    def test_min_delta(self):
+        progress = FbProgress(min_interval=0, min_delta=0.1)
+        progress.update(100, 0)
+        self.assertEqual(progress.update(100, 5), None)
+        self.assertEqual(progress.update(100, 10), FbProgress.RUNNING)
+        self.assertEqual(progress.update(100, 15), None)
+        self.assertEqual(progress.update(100, 25), FbProgress.RUNNING)
+
+
+class TestFbTransferGroup(unittest.TestCase):
+    def setUp(self):
+        self._group = FbTransferGroup(min_interval=0)
+        self._reported = []
+        self._group.connect('progress', self._progress_cb)
+
+    def _progress_cb(self, group, done, total):
+        self._reported.append((done, total))
+
+    def test_aggregate(self):
+        first = FbProgress(self._group)
+        second = FbProgress(self._group)
+        first.update(100, 50)
+        second.update(300, 30)
+        self.assertEqual(self._group.bytes(), (80, 400))
+        self.assertEqual(self._group.active_count(), 2)
+
+        first.update(100, 100)
+        first.finish()
+        self.assertEqual(self._group.bytes(), (130, 400))
+        self.assertEqual(self._group.active_count(), 1)
+        self.assertEqual(self._reported[-1], (130.0, 400.0))
+
+    def test_discard(self):
+        # a retried attempt leaves nothing behind
+        failed = FbProgress(self._group)
+        failed.update(100, 60)
+        failed.discard()
+        retry = FbProgress(self._group)
+        retry.update(100, 100)
+        retry.finish()
+        self.assertEqual(self._group.bytes(), (100, 100))
+
+    def test_min_interval(self):
+        group = FbTransferGroup(min_interval=3600)
+        reported = []
+        group.connect('progress', lambda g, d, t: reported.append((d, t)))
+        progress = FbProgress(group)
+        progress.update(100, 10)
+        progress.update(100, 20)
+        self.assertEqual(len(reported), 1)
+        progress.finish()
+        self.assertEqual(reported[-1], (20.0, 100.0))
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='ignored, these tests make no calls')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='ignored, these tests make no calls')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    unittest.main(argv=['test_fb_progress'])
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+
+import argparse
+import json
+import logging
+import sys
+import unittest
+
+sys.path.append("..")
+
+import pycurl
+
+from facebook import fb_types
+from facebook.fb_retry import FbRateLimiter, FbRetryPolicy, classify_error
+
+
+def _error(code):
+    return json.dumps({'error': {'message': "oops", 'type': 'OAuthException',
+                                 'code': code}})
+
+
+class TestClassifyError(unittest.TestCase):
+    def test_success(self):
+        self.assertEqual(classify_error(200), fb_types.FB_ERROR_NONE)
+        self.assertEqual(classify_error(304), fb_types.FB_ERROR_NONE)
+
+    def test_network(self):
+        self.assertEqual(classify_error(pycurl.E_COULDNT_CONNECT),
+                         fb_types.FB_ERROR_NETWORK)
+
+    def test_throttled(self):
+        self.assertEqual(classify_error(429), fb_types.FB_ERROR_THROTTLED)
+        for code in (4, 17, 32, 341, 613, 80001):
+            self.assertEqual(classify_error(400, _error(code)),
+                             fb_types.FB_ERROR_THROTTLED)
+
+    def test_auth(self):
+        self.assertEqual(classify_error(401), fb_types.FB_ERROR_AUTH)
+        self.assertEqual(classify_error(400, _error(190)),
+                         fb_types.FB_ERROR_AUTH)
+
+    def test_server_and_client(self):
+        self.assertEqual(classify_error(503, "not json"),
+                         fb_types.FB_ERROR_SERVER)
+        self.assertEqual(classify_error(400, _error(100)),
+                         fb_types.FB_ERROR_CLIENT)
+
+
+class TestFbRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self._policy = FbRetryPolicy(max_attempts=3, base_delay=0.5,
+                                     max_delay=2)
+
+    def test_max_attempts(self):
+        throttled = fb_types.FB_ERROR_THROTTLED
+        self.assertTrue(self._policy.should_retry(2, True, 429, throttled))
+        self.assertFalse(self._policy.should_retry(3, True, 429, throttled))
+
+    def test_what_is_retried(self):
+        network = fb_types.FB_ERROR_NETWORK
+        server = fb_types.FB_ERROR_SERVER
+        policy = self._policy
+
+        # a POST is only sent again if it never reached the server
+        self.assertTrue(policy.should_retry(1, False, pycurl.E_RECV_ERROR,
+                                            network))
+        self.assertFalse(policy.should_retry(1, True, pycurl.E_RECV_ERROR,
+                                             network))
+        self.assertTrue(policy.should_retry(1, True, pycurl.E_COULDNT_CONNECT,
+                                            network))
+        self.assertTrue(policy.should_retry(1, False, 500, server))
+        self.assertFalse(policy.should_retry(1, True, 500, server))
+        self.assertFalse(policy.should_retry(1, False, 400,
+                                             fb_types.FB_ERROR_CLIENT))
+        self.assertFalse(policy.should_retry(1, False, 401,
+                                             fb_types.FB_ERROR_AUTH))
+
+    def test_backoff(self):
+        for attempt, ceiling in ((0, 0.5), (1, 1.0), (2, 2.0), (5, 2.0)):
+            for i in range(50):
+                delay = self._policy.delay(attempt)
+                self.assertTrue(0 <= delay <= ceiling)
+
+
+class TestFbRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self._limiter = FbRateLimiter(rate=10, burst=2)
+        self._calls = []
+
+    def _acquire(self, count):
+        for i in range(count):
+            self._limiter.acquire(lambda: self._calls.append(True))
+
+    def test_burst_and_refill(self):
+        # time is moved by hand, keep the refill timeout off the loop
+        self._limiter._timeout_id = object()
+        self._acquire(3)
+        self.assertEqual(len(self._calls), 2)
+        self.assertEqual(self._limiter.waiting_count(), 1)
+
+        # as if a tenth of a second had gone by
+        self._limiter._last_refill -= 0.1
+        self._limiter._dispatch()
+        self.assertEqual(len(self._calls), 3)
+        self.assertEqual(self._limiter.waiting_count(), 0)
+
+    def test_throttled(self):
+        self._limiter.report(fb_types.FB_ERROR_THROTTLED, {})
+        self.assertEqual(self._limiter.rate, 5)
+
+        self._limiter._timeout_id = object()
+        self._acquire(1)
+        self.assertEqual(len(self._calls), 0)
+
+    def test_usage_headers(self):
+        usage = {'x-app-usage': json.dumps({'call_count': 90,
+                                            'total_time': 10,
+                                            'total_cputime': 5})}
+        self._limiter.report(fb_types.FB_ERROR_NONE, usage)
+        self.assertAlmostEqual(self._limiter.rate, 4.0)
+
+        usage = {'x-business-use-case-usage': json.dumps(
+                {'123': [{'call_count': 5, 'total_time': 99}]})}
+        self._limiter.report(fb_types.FB_ERROR_NONE, usage)
+        self.assertAlmostEqual(self._limiter.rate, 0.4)
+
+    def test_steady_usage(self):
+        usage = {'x-app-usage': json.dumps({'call_count': 80})}
+        for i in range(50):
+            self._limiter.report(fb_types.FB_ERROR_NONE, usage)
+        self.assertAlmostEqual(self._limiter.rate, 8.0)
+
+        # and back up once the usage goes down
+        for i in range(50):
+            self._limiter.report(fb_types.FB_ERROR_NONE, {})
+        self.assertAlmostEqual(self._limiter.rate, 13.0)
+
+    def test_recovery(self):
+        self._limiter.report(fb_types.FB_ERROR_NONE, {})
+        self.assertAlmostEqual(self._limiter.rate,
+                               10 + FbRateLimiter.RECOVERY)
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='ignored, these tests make no calls')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='ignored, these tests make no calls')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    unittest.main(argv=['test_fb_retry'])
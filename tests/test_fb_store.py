@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_comment import FbCommentList
+from facebook.fb_photo import FbPhoto
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from facebook.fb_store import FbStore
+from fb_mock_server import FbMockServer
+
+
+def _comment(i, created_time):
+    return {'id': "1_%d" % (i), 'from': {'id': '1', 'name': 'Mock User'},
+            'message': "comment %d" % (i), 'created_time': created_time}
+
+
+class TestFbStore(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    photo_path = 'test.png'
+
+    def setUp(self):
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+        self._store = FbStore(':memory:')
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+        self._store.close()
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def test_compaction(self):
+        store = FbStore(':memory:', max_comments=3)
+        comments = FbCommentList()
+        for i in range(5):
+            comments.append_data(_comment(i, "2012-05-01T10:00:0%d+0000" % i))
+        store.add_comments('1', comments)
+
+        self.assertEqual(store.comment_count(), 3)
+        stored = store.comments('1')
+        self.assertEqual([c.message for c in stored],
+                         ["comment 2", "comment 3", "comment 4"])
+        self.assertEqual(len(store.comments('1', since=stored[2].created)), 1)
+        store.close()
+
+    def test_warm_start(self):
+        def photo_created_cb(photo, photo_id):
+            logging.debug("Photo created: %s" % (photo_id))
+            self.assertEqual(self._store.photo_ids(), [photo_id])
+            photo.connect('comment-added', first_added_cb)
+            photo.add_comment("first")
+            return False
+
+        def first_added_cb(photo, comment_id):
+            photo.connect('comments-stream-completed', synced_cb)
+            photo.stream_comments()
+
+        def synced_cb(photo, count):
+            self.assertEqual(self._store.comment_count(photo.fb_object_id), 1)
+            photo.connect('comment-added', second_added_cb)
+            photo.add_comment("second")
+
+        def second_added_cb(photo, comment_id):
+            # as if the process had restarted
+            restarted = FbPhoto(photo.fb_object_id)
+            restarted.set_store(self._store)
+            restarted.connect('comments-downloaded', stored_cb)
+            restarted.connect('comments-page-downloaded', page_cb)
+            restarted.connect('comments-stream-completed', completed_cb)
+            restarted.load_comments()
+
+        loaded = []
+        def stored_cb(photo, comments):
+            self.assertEqual([c.message for c in comments], ["first"])
+            loaded.extend(comments)
+
+        def page_cb(photo, comments):
+            self.assertEqual([c.message for c in comments], ["second"])
+            loaded.extend(comments)
+
+        def completed_cb(photo, count):
+            self.assertEqual(len(loaded), 2)
+            self.assertEqual(self._store.comment_count(), 2)
+            self._finish_test()
+
+        photo = FbPhoto()
+        photo.set_store(self._store)
+        photo.connect('photo-created', photo_created_cb)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_store'])
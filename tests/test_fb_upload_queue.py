@@ -0,0 +1,163 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_dedup import FbUploadIndex
+from facebook.fb_upload_queue import FbUploadQueue
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from fb_mock_server import FbMockServer
+
+
+# bad responses are injected by the mock server
+server = None
+
+
+class TestFbUploadQueue(unittest.TestCase):
+    PER_TEST_TIMEOUT = 60000
+    photo_path = 'test.png'
+
+    def _mock_graph(self):
+        if server is None:
+            self.skipTest("needs --mock")
+        return server.graph
+
+    def setUp(self):
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def test_upload_many(self):
+        created = []
+        def photo_created_cb(queue, path, photo_id):
+            logging.debug("Photo created from %s: %s" % (path, photo_id))
+            created.append(photo_id)
+            self.assertTrue(queue.in_flight_count() <= 2)
+
+        def finished_cb(queue, done, failed, callback):
+            logging.debug("%d photos uploaded, %d failed", done, failed)
+            if done == 5:
+                callback()
+
+        queue = FbUploadQueue(max_concurrent=2)
+        queue.connect('photo-created', photo_created_cb)
+        queue.connect('finished', finished_cb, self._finish_test)
+        queue.add_iterator([self.photo_path] * 5)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_cancel(self):
+        def finished_cb(queue, done, failed, callback):
+            logging.debug("%d photos uploaded, %d failed", done, failed)
+            if done == 1:
+                callback()
+
+        queue = FbUploadQueue(max_concurrent=1)
+        queue.connect('finished', finished_cb, self._finish_test)
+        queue.add(self.photo_path, priority=1)
+        source_id = queue.add_iterator([self.photo_path] * 10)
+        queue.cancel(source_id)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_dedup(self):
+        created = []
+        def photo_created_cb(queue, path, photo_id):
+            logging.debug("Photo created from %s: %s" % (path, photo_id))
+            created.append(photo_id)
+
+        def finished_cb(queue, done, failed, callback):
+            if done == 3:
+                callback()
+
+        index = FbUploadIndex(':memory:')
+        queue = FbUploadQueue(max_concurrent=3, dedup=index)
+        queue.connect('photo-created', photo_created_cb)
+        queue.connect('finished', finished_cb, self._finish_test)
+        queue.add_iterator([self.photo_path] * 3)
+        self._loop.run()
+        index.close()
+        assert(self._completed)
+        self.assertEqual(len(set(created)), 1)
+        self.assertEqual(len(created), 3)
+
+    def test_bad_response(self):
+        self._mock_graph().bad_creates = 1
+
+        def finished_cb(queue, done, failed, callback):
+            logging.debug("%d photos uploaded, %d failed", done, failed)
+            self.assertEqual((done, failed), (2, 1))
+            self.assertEqual(queue.in_flight_count(), 0)
+            callback()
+
+        queue = FbUploadQueue(max_concurrent=1)
+        queue.connect('finished', finished_cb, self._finish_test)
+        queue.add_iterator([self.photo_path] * 3)
+        self._loop.run()
+        assert(self._completed)
+
+    def test_dedup_bad_response(self):
+        self._mock_graph().bad_creates = 2
+
+        def finished_cb(queue, done, failed, callback):
+            logging.debug("%d photos uploaded, %d failed", done, failed)
+            self.assertEqual((done, failed), (0, 2))
+            callback()
+
+        index = FbUploadIndex(':memory:')
+        queue = FbUploadQueue(max_concurrent=2, dedup=index)
+        queue.connect('finished', finished_cb, self._finish_test)
+        queue.add_iterator([self.photo_path] * 2)
+        self._loop.run()
+        index.close()
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_upload_queue'])
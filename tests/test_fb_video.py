@@ -0,0 +1,190 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+import sys
+import unittest
+
+sys.path.append("..")
+
+from facebook.fb_video import FbVideo
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from fb_mock_server import FbMockServer
+
+
+# the chunk failures are injected by the mock server
+server = None
+
+
+class TestFbVideo(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    VIDEO_SIZE = 10000
+
+    def setUp(self):
+        if server is None:
+            self.skipTest("needs --mock")
+
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+
+        self._graph = server.graph
+        self._graph.fail_chunks = 0
+        self._graph.chunk_failure = (500, 2, "Chunk lost")
+        self._graph.video_transfers = 0
+        self._graph.latency = 0.0
+
+        fd, self._video_path = tempfile.mkstemp(suffix='.mp4')
+        self._video = os.urandom(self.VIDEO_SIZE)
+        os.write(fd, self._video)
+        os.close(fd)
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+        os.unlink(self._video_path)
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def _video_created_cb(self, video, video_id):
+        logging.debug("Video created: %s" % (video_id))
+        self.assertEqual(self._graph.video_data(video_id), self._video)
+        self._finish_test()
+
+    def _chunks(self):
+        chunk_size = self._graph.video_chunk_size
+        return (self.VIDEO_SIZE + chunk_size - 1) / chunk_size
+
+    def test_chunked_upload(self):
+        video = FbVideo()
+        video.connect('video-created', self._video_created_cb)
+        video.create(self._video_path)
+        self._loop.run()
+        assert(self._completed)
+        self.assertEqual(self._graph.video_transfers, self._chunks())
+
+    def test_chunk_retry(self):
+        self._graph.fail_chunks = 1
+
+        video = FbVideo()
+        video.RETRY_DELAY = 0
+        video.connect('video-created', self._video_created_cb)
+        video.create(self._video_path)
+        self._loop.run()
+        assert(self._completed)
+        self.assertEqual(self._graph.video_transfers, self._chunks() + 1)
+
+    def test_resume(self):
+        self._graph.fail_chunks = 2
+
+        def video_create_failed_cb(video, reason):
+            logging.debug("Upload interrupted: %s" % (reason))
+            video.resume()
+
+        video = FbVideo()
+        video.RETRY_DELAY = 0
+        video.MAX_CHUNK_RETRIES = 1
+        video.connect('video-create-failed', video_create_failed_cb)
+        video.connect('video-created', self._video_created_cb)
+        video.create(self._video_path)
+        self._loop.run()
+        assert(self._completed)
+        self.assertEqual(self._graph.video_transfers, self._chunks() + 2)
+
+    def test_resume_while_retry_pending(self):
+        self._graph.fail_chunks = 1
+        # slow enough for the retry to come while resumed chunks still go
+        self._graph.latency = 0.4
+
+        def transfer_failed_cb(video, fb_type, transfer_type, reason):
+            # once the retry is scheduled, resume() must not send it too
+            GObject.idle_add(video.resume)
+
+        failures = []
+        def video_create_failed_cb(video, reason):
+            failures.append(reason)
+
+        video = FbVideo()
+        video.RETRY_DELAY = 1
+        video.connect('transfer-failed', transfer_failed_cb)
+        video.connect('video-created', self._video_created_cb)
+        video.connect('video-create-failed', video_create_failed_cb)
+        video.create(self._video_path)
+        self._loop.run()
+        assert(self._completed)
+        self.assertEqual(failures, [])
+        self.assertEqual(self._graph.video_transfers, self._chunks() + 1)
+
+    def test_resume_while_sending(self):
+        self._graph.latency = 0.2
+
+        def transfer_progress_cb(video, fb_type, transfer_type, fraction):
+            # the next chunk is on its way by the time this runs
+            GObject.idle_add(video.resume)
+
+        video = FbVideo()
+        video.connect('transfer-progress', transfer_progress_cb)
+        video.connect('video-created', self._video_created_cb)
+        video.create(self._video_path)
+        self._loop.run()
+        assert(self._completed)
+        self.assertEqual(self._graph.video_transfers, self._chunks())
+
+    def test_chunk_client_error(self):
+        self._graph.fail_chunks = 1
+        self._graph.chunk_failure = (400, 6001, "Bad start offset")
+
+        def video_create_failed_cb(video, reason):
+            logging.debug("Upload failed: %s" % (reason))
+            self._finish_test()
+
+        video = FbVideo()
+        video.RETRY_DELAY = 0
+        video.connect('video-create-failed', video_create_failed_cb)
+        video.create(self._video_path)
+        self._loop.run()
+        assert(self._completed)
+        # not retried
+        self.assertEqual(self._graph.video_transfers, 1)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_video'])
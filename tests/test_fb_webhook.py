@@ -0,0 +1,142 @@
+#!/usr/bin/python
+
+from gi.repository import GObject
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import time
+import sys
+import unittest
+import urllib
+import urllib2
+
+sys.path.append("..")
+
+from facebook.fb_photo import FbPhoto
+from facebook.fb_account import FbAccount
+from facebook.fb_object import FbObject
+from facebook.fb_webhook import FbWebhookReceiver
+from fb_mock_server import FbMockServer
+
+
+VERIFY_TOKEN = "verify-me"
+APP_SECRET = "app-secret"
+
+
+def _send(url, payload, secret=APP_SECRET):
+    """ stands in for the Graph API delivering a notification """
+    body = json.dumps(payload)
+    signature = hmac.new(secret, body, hashlib.sha256).hexdigest()
+    request = urllib2.Request(url, body,
+                              {'Content-Type': 'application/json',
+                               'X-Hub-Signature-256': "sha256=%s" % signature})
+    try:
+        return urllib2.urlopen(request).getcode()
+    except urllib2.HTTPError as ex:
+        return ex.code
+
+
+class TestFbWebhook(unittest.TestCase):
+    PER_TEST_TIMEOUT = 30000
+    photo_path = 'test.png'
+
+    def setUp(self):
+        logging.debug("Starting (%d)", int(time.time()))
+        self._loop = GObject.MainLoop()
+        self._tid = GObject.timeout_add(self.PER_TEST_TIMEOUT, self._timeout_cb)
+        self._completed = False
+        self._receiver = FbWebhookReceiver(VERIFY_TOKEN, APP_SECRET, window=10)
+        self._url = self._receiver.start()
+
+    def tearDown(self):
+        GObject.source_remove(self._tid)
+        self._receiver.stop()
+
+    def _finish_test(self):
+        self._completed = True
+        self._loop.quit()
+
+    def test_verify_subscription(self):
+        query = urllib.urlencode([('hub.mode', 'subscribe'),
+                                  ('hub.verify_token', VERIFY_TOKEN),
+                                  ('hub.challenge', '1158201444')])
+        self.assertEqual(urllib2.urlopen(self._url + "?" + query).read(),
+                         '1158201444')
+
+        query = urllib.urlencode([('hub.mode', 'subscribe'),
+                                  ('hub.verify_token', 'wrong'),
+                                  ('hub.challenge', '1158201444')])
+        self.assertRaises(urllib2.HTTPError, urllib2.urlopen,
+                          self._url + "?" + query)
+
+    def test_bad_signature(self):
+        self.assertEqual(_send(self._url, {'entry': []}, "not-the-secret"),
+                         403)
+
+    def test_notification_fetches_comments(self):
+        def photo_created_cb(photo, photo_id, callback):
+            logging.debug("Photo created: %s" % (photo_id))
+            photo.connect('comment-added', comment_added_cb, callback)
+            photo.add_comment("pushed comment")
+            return False
+
+        def comment_added_cb(photo, comment_id, callback):
+            logging.debug("Comment created: %s" % (comment_id))
+            photo.connect('comments-page-downloaded', page_cb, callback)
+            self._receiver.watch(photo)
+
+            payload = {'object': 'page', 'entry': [
+                    {'id': '1', 'time': int(time.time()), 'changes': [
+                        {'field': 'feed',
+                         'value': {'item': 'comment', 'verb': 'add',
+                                   'post_id': photo.fb_object_id,
+                                   'comment_id': comment_id}}]}]}
+            self.assertEqual(_send(self._url, payload), 200)
+            return False
+
+        def page_cb(photo, comments, callback):
+            self.assertEqual(comments[0]['message'], "pushed comment")
+            callback()
+
+        photo = FbPhoto()
+        photo.connect('photo-created', photo_created_cb, self._finish_test)
+        photo.create(self.photo_path)
+        self._loop.run()
+        assert(self._completed)
+
+    def _timeout_cb(self):
+        self._loop.quit()
+        return False
+
+def _get_params():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug',
+                        type=bool,
+                        default=False)
+    parser.add_argument('--mock',
+                        action='store_true',
+                        help='run against a local mock Graph API server')
+    parser.add_argument('access_token',
+                        nargs='?',
+                        default='mock',
+                        help='token to run the tests with')
+    parser.add_argument('test_name',
+                        nargs='?',
+                        default='')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    params = _get_params()
+
+    if params.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if params.mock:
+        server = FbMockServer()
+        FbObject.GRAPH_URL = server.start()
+
+    FbAccount.set_access_token(params.access_token)
+    unittest.main(argv=['test_fb_webhook'])